@@ -4,10 +4,12 @@ import os
 BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_DIR = BASE_DIR.parent / "uploads"
 UNZIP_DIR = BASE_DIR.parent / "unzipped"
+CACHE_DIR = BASE_DIR.parent / "cache"
 TEMPLATES = BASE_DIR / "templates"
 STATIC = BASE_DIR / "static"
 UPLOAD_DIR.mkdir(exist_ok=True)
 UNZIP_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
@@ -15,5 +17,74 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "app")
 POSTGRES_SERVER = os.getenv("POSTGRES_SERVER", "db")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{
-    POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}"
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# Limits for one gradebook ingest, counted over every nested archive
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", 2 * 1024 ** 3))
+EXTRACT_MAX_ENTRIES = int(os.getenv("EXTRACT_MAX_ENTRIES", 100_000))
+EXTRACT_MAX_RATIO = int(os.getenv("EXTRACT_MAX_RATIO", 200))
+EXTRACT_MAX_DEPTH = int(os.getenv("EXTRACT_MAX_DEPTH", 3))
+NESTED_SPOOL_BYTES = int(os.getenv("NESTED_SPOOL_BYTES", 32 * 1024 * 1024))
+
+PYTHON = os.getenv("GRADER_PYTHON", "python3")
+# Batch grading runs in a long-lived pool of JOB_WORKERS processes, each
+# running up to TEST_WORKERS tests at once; by default the two share the
+# CPUs instead of multiplying them
+CPU_COUNT = os.cpu_count() or 1
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", min(2, CPU_COUNT)))
+TEST_WORKERS = int(os.getenv(
+    "TEST_WORKERS", max(1, CPU_COUNT // max(1, JOB_WORKERS))))
+# "subprocess" starts a fresh interpreter per test, "forkserver" forks
+# each test from a pool of pre-imported zygote processes and "harness"
+# loads each student file once and forks every one of its cases from it
+TEST_BACKEND = os.getenv("TEST_BACKEND", "subprocess")
+ZYGOTE_POOL_SIZE = int(os.getenv("ZYGOTE_POOL_SIZE", TEST_WORKERS))
+# Seconds a test waits for a busy zygote before giving up
+ZYGOTE_ACQUIRE_TIMEOUT = float(os.getenv("ZYGOTE_ACQUIRE_TIMEOUT", 300))
+ZYGOTE_PRELOAD = os.getenv(
+    "ZYGOTE_PRELOAD",
+    "collections,itertools,functools,heapq,math,random,re,json,copy,typing,dataclasses"
+).split(",")
+# Every test runs in its own process group under these limits; a limit of
+# 0 disables it, TEST_SANDBOX=0 disables all of them
+TEST_SANDBOX = os.getenv("TEST_SANDBOX", "1") == "1"
+TEST_TIMEOUT = float(os.getenv("TEST_TIMEOUT", 30))
+TEST_CPU_LIMIT = int(os.getenv("TEST_CPU_LIMIT", 30))
+TEST_MEMORY_LIMIT = int(os.getenv("TEST_MEMORY_LIMIT", 2 * 1024 ** 3))
+TEST_NPROC_LIMIT = int(os.getenv("TEST_NPROC_LIMIT", 256))
+TEST_FSIZE_LIMIT = int(os.getenv("TEST_FSIZE_LIMIT", 64 * 1024 * 1024))
+# Only the start and end of each test's stdout/stderr are kept; a piped
+# stream longer than OUTPUT_MAX_BYTES gets its process killed
+OUTPUT_HEAD_BYTES = int(os.getenv("OUTPUT_HEAD_BYTES", 16 * 1024))
+OUTPUT_TAIL_BYTES = int(os.getenv("OUTPUT_TAIL_BYTES", 64 * 1024))
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", 64 * 1024 * 1024))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2.0))
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", 1.0))
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_MAX_BYTES = int(
+    os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Highlighted code is cached per process in memory and shared on disk
+HIGHLIGHT_MEMORY_BYTES = int(
+    os.getenv("HIGHLIGHT_MEMORY_BYTES", 32 * 1024 * 1024))
+HIGHLIGHT_CACHE_MAX_BYTES = int(
+    os.getenv("HIGHLIGHT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Assignment rows, rubric included, cached per web process; an entry lives
+# until its TTL expires or this process changes the assignment
+ASSIGNMENT_CACHE_SIZE = int(os.getenv("ASSIGNMENT_CACHE_SIZE", 256))
+ASSIGNMENT_CACHE_TTL = float(os.getenv("ASSIGNMENT_CACHE_TTL", 30))
+# Assignments whose analytics each process keeps; an entry is reused
+# until the assignment's next grade write
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 64))
+ANALYTICS_HISTOGRAM_BINS = int(os.getenv("ANALYTICS_HISTOGRAM_BINS", 10))
+# Connection pool per engine, in every web and job worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Checkouts that wait longer than this are logged
+DB_POOL_SLOW_CHECKOUT = float(os.getenv("DB_POOL_SLOW_CHECKOUT", 0.5))
+
+# Takes precedence over the POSTGRES_* settings, e.g. sqlite:///grader.db
+DATABASE_URL = os.getenv("DATABASE_URL", f"postgresql://{POSTGRES_USER}:{
+    POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}")
@@ -1,14 +1,57 @@
-from sqlalchemy import create_engine
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app import DATABASE_URL
+from app import (
+    BASE_DIR,
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+)
+from app.utils.pool import TimedQueuePool, TimedAsyncQueuePool
 
 SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+MIGRATIONS = BASE_DIR / "migrations"
+# Revision matching the schema create_all built before migrations existed
+BASELINE_REVISION = "0001"
+# pg_advisory_xact_lock namespace held while migrating
+MIGRATION_LOCK = 2
+
+# Drivers for the same database when used from async routes
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL,
+                       poolclass=TimedQueuePool, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+database_url = make_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(
+    database_url.set(drivername=ASYNC_DRIVERS[database_url.get_backend_name()]),
+    poolclass=TimedAsyncQueuePool, **POOL_OPTIONS)
+
+# Attributes stay loaded after commit, so templates can use them without
+# another round trip
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -18,3 +61,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def bulk_upsert(db, model, rows, index_elements, update_columns, batch_size=1000):
+    """INSERT ... ON CONFLICT DO UPDATE for many rows in as few statements as possible."""
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+    for start in range(0, len(rows), batch_size):
+        stmt = insert(model).values(rows[start:start + batch_size])
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={column: stmt.excluded[column]
+                      for column in update_columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+        db.execute(stmt)
+
+
+def migrate(bind=engine):
+    """Bring the schema up to the latest revision.
+
+    Databases created by create_all before migrations existed are stamped
+    with the baseline first. Workers starting together wait for whichever
+    takes the lock first instead of racing to migrate.
+    """
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS))
+    with bind.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK, 0)))
+        config.attributes["connection"] = connection
+
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current is None and inspect(connection).has_table("submissions"):
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
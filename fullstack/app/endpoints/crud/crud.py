@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.models import Assignment, Submission, Student, Group
+from app.models import Assignment, Submission, Student, Group, TestResult
 from app.database import get_db
+from app.utils.test_results import sync_test_results, in_rubric_order
+from app.utils.analytics import grades_changed
+from app.utils.assignments import get_assignment as get_cached_assignment, invalidate_assignment
 from .schemas import AssignmentCreate, SubmissionCreate, StudentCreate, GroupCreate, AssignmentUpdate, SubmissionUpdate, SubmissionUpdateGradeFeedback, SubmissionUpdateTestCases
 
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(tags=["CRUD"], dependencies=[Depends(get_db)])
 
@@ -44,6 +48,7 @@ def update_assignment(assignment_id: int, assignment: AssignmentUpdate, db: Sess
         setattr(db_assignment, key, value)
 
     db.commit()
+    invalidate_assignment(assignment_id)
     db.refresh(db_assignment)
     return db_assignment
 
@@ -57,6 +62,7 @@ def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
 
     db.delete(db_assignment)
     db.commit()
+    invalidate_assignment(assignment_id)
     return {"message": "Assignment deleted successfully"}
 
 
@@ -64,6 +70,9 @@ def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
 def create_submission(submission: SubmissionCreate, db: Session = Depends(get_db)):
     db_submission = Submission(**submission.dict())
     db.add(db_submission)
+    db.flush()
+    sync_test_results(db, [(db_submission.id, db_submission.test_cases)])
+    grades_changed(db, db_submission.assignment_id)
     db.commit()
     db.refresh(db_submission)
     return db_submission
@@ -77,6 +86,7 @@ def delete_submission(submission_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Submission not found")
 
     db.delete(db_submission)
+    grades_changed(db, db_submission.assignment_id)
     db.commit()
     return {"message": "Submission deleted successfully"}
 
@@ -112,6 +122,7 @@ def update_student(user_id: str, student: StudentCreate, db: Session = Depends(g
 
     for key, value in student.dict(exclude_unset=True).items():
         setattr(db_student, key, value)
+    grades_changed(db)
 
     db.commit()
     db.refresh(db_student)
@@ -125,6 +136,7 @@ def delete_student(user_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Student not found")
 
     db.delete(db_student)
+    grades_changed(db)
     db.commit()
     return {"message": "Student deleted successfully"}
 
@@ -160,6 +172,7 @@ def update_group(group_id: int, group: GroupCreate, db: Session = Depends(get_db
 
     for key, value in group.dict(exclude_unset=True).items():
         setattr(db_group, key, value)
+    grades_changed(db)
 
     db.commit()
     db.refresh(db_group)
@@ -173,6 +186,7 @@ def delete_group(group_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Group not found")
 
     db.delete(db_group)
+    grades_changed(db)
     db.commit()
     return {"message": "Group deleted successfully"}
 
@@ -196,6 +210,7 @@ def update_grade_feedback_by_userid(
     # Update grade if provided
     if submission_data.grade is not None:
         db_submission.grade = submission_data.grade
+        grades_changed(db, assignment_number)
 
     # Update feedback if provided
     if submission_data.feedback is not None:
@@ -236,6 +251,13 @@ def get_grade_feedback_by_userid(
     }
 
 
+def rubric_ordered_test_cases(db: Session, submission: Submission):
+    # The grading checklist follows the rubric, whatever order the database keeps
+    assignment = get_cached_assignment(db, submission.assignment_id)
+    rubric_cases = assignment.rubric.get("test_cases") if assignment else None
+    return in_rubric_order(submission.test_cases, rubric_cases)
+
+
 @router.put("/submissions/test_cases", response_model=dict)
 def update_grade_feedback_by_userid(
     submission_data: SubmissionUpdateTestCases,
@@ -254,12 +276,15 @@ def update_grade_feedback_by_userid(
 
     if submission_data.test_cases is not None:
         db_submission.test_cases = submission_data.test_cases
+        sync_test_results(
+            db, [(db_submission.id, db_submission.test_cases)])
+        grades_changed(db, assignment_number)
 
     db.commit()
     db.refresh(db_submission)
 
     return {
-        "test_cases": db_submission.test_cases
+        "test_cases": rubric_ordered_test_cases(db, db_submission)
     }
 
 
@@ -280,5 +305,80 @@ def get_grade_feedback_by_userid(
         )
 
     return {
-        "test_cases": db_submission.test_cases
+        "test_cases": rubric_ordered_test_cases(db, db_submission)
     }
+
+
+def get_assignment_or_404(db: Session, assignment_id: int):
+    if db.query(Assignment.id).filter(Assignment.id == assignment_id).first() is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+
+@router.get("/assignments/{assignment_id}/test_results/summary", response_model=List[dict])
+def get_test_results_summary(assignment_id: int, db: Session = Depends(get_db)):
+    """Grading states and run outcomes of every test case, counted across the class."""
+    get_assignment_or_404(db, assignment_id)
+
+    def count(condition):
+        return func.count(TestResult.id).filter(condition)
+
+    rows = db.query(
+        TestResult.test_case,
+        func.count(TestResult.id).label("total"),
+        count(TestResult.status == "correct").label("correct"),
+        count(TestResult.status == "incorrect").label("incorrect"),
+        count(TestResult.status == "ungraded").label("ungraded"),
+        count(TestResult.run_status != "ok").label("failed_runs"),
+        func.avg(TestResult.duration).label("mean_duration"),
+        func.max(TestResult.duration).label("max_duration"),
+        func.count(TestResult.output_hash.distinct()).label("distinct_outputs"),
+    ).join(Submission, TestResult.submission_id == Submission.id).filter(
+        Submission.assignment_id == assignment_id
+    ).group_by(TestResult.test_case).order_by(TestResult.test_case)
+
+    summary = []
+    for row in rows:
+        graded = row.correct + row.incorrect
+        summary.append({
+            **row._asdict(),
+            "pass_rate": row.correct / graded if graded else None,
+        })
+    return summary
+
+
+@router.get("/assignments/{assignment_id}/test_results", response_model=List[dict])
+def list_test_results(
+    assignment_id: int,
+    test_case: Optional[str] = Query(None, description='e.g. "p1.py bfs case3"'),
+    status: Optional[str] = Query(None, description="correct, incorrect or ungraded"),
+    run_status: Optional[str] = Query(None, description="How the test's last run ended, e.g. timeout"),
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    get_assignment_or_404(db, assignment_id)
+
+    query = db.query(Submission.student_id, TestResult).join(
+        Submission, TestResult.submission_id == Submission.id
+    ).filter(Submission.assignment_id == assignment_id)
+    if test_case is not None:
+        query = query.filter(TestResult.test_case == test_case)
+    if status is not None:
+        query = query.filter(TestResult.status == status)
+    if run_status is not None:
+        query = query.filter(TestResult.run_status == run_status)
+
+    rows = query.order_by(Submission.student_id, TestResult.test_case).offset(
+        skip).limit(limit)
+    return [
+        {
+            "student_id": student_id,
+            "test_case": result.test_case,
+            "status": result.status,
+            "score": result.score,
+            "run_status": result.run_status,
+            "duration": result.duration,
+            "output_hash": result.output_hash,
+        }
+        for student_id, result in rows
+    ]
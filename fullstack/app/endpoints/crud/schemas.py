@@ -19,6 +19,7 @@ class SubmissionCreate(BaseModel):
     grade: Optional[float] = None
     submission_date: Optional[datetime] = None
     feedback: Optional[dict]
+    test_cases: dict = {}
     file_path: str
     student_id: str
     assignment_id: int
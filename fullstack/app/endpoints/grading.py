@@ -1,17 +1,22 @@
-import os
+import gzip
 import json
-import logging
 import asyncio
+import logging
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor
-from fastapi import APIRouter, Request, HTTPException, Depends, Query, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, FileResponse, Response
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import BASE_DIR
-from app.database import get_db
-from app.models import Student, Assignment, Submission
-from app.utils.testrunner import TestRunner
+from app import PROGRESS_INTERVAL
+from app.database import get_db, get_async_db, AsyncSessionLocal
+from app.models import Student, Assignment, Submission, Group, Job
+from app.utils import jobs, analytics
+from app.utils.assignments import get_assignment, get_assignment_async
+from app.utils.render import results_dir, read_manifest, render_key, is_fresh, artifact_path
 
 logger = logging.getLogger('uvicorn.error')
 router = APIRouter(tags=["grading"])
@@ -19,9 +24,13 @@ templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
 
 @router.get("/assignment", response_class=HTMLResponse)
-async def get_assignments(request: Request, db: Session = Depends(get_db)):
-    assignments = db.query(Assignment).all()
-    submissions = db.query(Submission).all()
+async def get_assignments(request: Request, db: AsyncSession = Depends(get_async_db)):
+    assignments = (await db.execute(select(
+        Assignment.id,
+        Assignment.name,
+        Assignment.due_date,
+        func.count(Submission.id).label("num_submissions"),
+    ).outerjoin(Submission).group_by(Assignment.id).order_by(Assignment.id))).all()
 
     return templates.TemplateResponse(
         "available.html",
@@ -29,31 +38,41 @@ async def get_assignments(request: Request, db: Session = Depends(get_db)):
             "request": request,
             "assignments": assignments,
             "username": request.state.user,
-            "num_submissions": len(submissions)
         }
     )
 
 
 @router.get("/assignment/{assignment_number}", response_class=HTMLResponse)
-async def get_assignment_form(request: Request, assignment_number: int, db: Session = Depends(get_db)):
-    students = db.query(Student).all()
-    submissions = db.query(Submission).filter(
-        Submission.assignment_id == assignment_number).all()
+async def get_assignment_form(request: Request, assignment_number: int, db: AsyncSession = Depends(get_async_db)):
+    # One row per student, with their group and this assignment's submission if any
+    rows = (await db.execute(select(
+        Student.UserID,
+        Student.Name,
+        Group.group_number,
+        Submission.id.label("submission_id"),
+        Submission.submission_date,
+        Submission.grade,
+    ).outerjoin(Group, Student.group_id == Group.id).outerjoin(
+        Submission,
+        (Submission.student_id == Student.UserID) & (
+            Submission.assignment_id == assignment_number)
+    ))).all()
 
-    submissions_map = {s.student_id: s for s in submissions}
     student_data = [
         {
-            "UserID": student.UserID,
-            "Name": student.Name,
-            "group": student.group.group_number if student.group else "Ungrouped",
-            "submission_date": submissions_map.get(student.UserID).submission_date if student.UserID in submissions_map else None,
-            "grade": submissions_map.get(student.UserID).grade if student.UserID in submissions_map else None,
-            "link": f"/grade/assignment/{assignment_number}/{student.UserID}" if student.UserID in submissions_map else None
+            "UserID": row.UserID,
+            "Name": row.Name,
+            "group": row.group_number if row.group_number is not None else "Ungrouped",
+            "submission_date": row.submission_date,
+            "grade": row.grade,
+            "link": f"/grade/assignment/{assignment_number}/{row.UserID}" if row.submission_id else None
         }
-        for student in students
+        for row in rows
     ]
 
-    groups = sorted({s['group'] for s in student_data})
+    # Numbered groups first, then "Ungrouped"
+    groups = sorted({s['group'] for s in student_data},
+                    key=lambda group: (isinstance(group, str), group))
 
     return templates.TemplateResponse(
         "center.html",
@@ -67,20 +86,110 @@ async def get_assignment_form(request: Request, assignment_number: int, db: Sess
     )
 
 
+def latest_job_status(db: Session, assignment_number: int):
+    job = jobs.get_latest_job(db, "grade", assignment_number)
+    if job is None:
+        return None
+    return jobs.job_status(db, job)
+
+
+def sse(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Comment line that keeps proxies from closing a quiet stream
+KEEPALIVE = ": keepalive\n\n"
+KEEPALIVE_INTERVAL = 15.0
+
+
+@router.get("/assignment/{assignment_number}/progress")
+async def stream_progress(request: Request, assignment_number: int):
+    """Server-Sent Events for the assignment's latest grading run.
+
+    Sends every task once on connect, then only the tasks and job counts
+    that changed, and closes after the run finishes. The task list is only
+    re-read when the job's counts moved.
+    """
+    async def events():
+        loop = asyncio.get_running_loop()
+        last_job = None
+        seen = {}
+        quiet_since = loop.time()
+        async with AsyncSessionLocal() as db:
+            while not await request.is_disconnected():
+                job = await db.run_sync(latest_job_status, assignment_number)
+                if job is None:
+                    yield sse("end", {"status": None})
+                    return
+
+                if job != last_job:
+                    tasks = await db.run_sync(jobs.task_progress, job["job_id"])
+                    for task in tasks:
+                        if seen.get(task["task_id"]) != task["status"]:
+                            seen[task["task_id"]] = task["status"]
+                            yield sse("task", task)
+                    yield sse("job", job)
+                    last_job = job
+                    quiet_since = loop.time()
+                elif loop.time() - quiet_since >= KEEPALIVE_INTERVAL:
+                    yield KEEPALIVE
+                    quiet_since = loop.time()
+
+                if job["status"] in jobs.FINISHED:
+                    yield sse("end", job)
+                    return
+
+                # Hand the connection back between polls and read fresh rows next time
+                await db.rollback()
+                await asyncio.sleep(PROGRESS_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def get_stats_or_404(db: Session, assignment_number: int):
+    stats = analytics.assignment_stats(db, assignment_number)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    return stats
+
+
+# Sync routes: the NumPy work runs in the threadpool, off the event loop
+@router.get("/assignment/{assignment_number}/analytics", response_class=HTMLResponse)
+def get_analytics_page(request: Request, assignment_number: int, db: Session = Depends(get_db)):
+    return templates.TemplateResponse(
+        "analytics.html",
+        {
+            "request": request,
+            "assignment_number": assignment_number,
+            "stats": get_stats_or_404(db, assignment_number),
+            "username": request.state.user,
+        }
+    )
+
+
+@router.get("/assignment/{assignment_number}/analytics/data", response_class=JSONResponse)
+def get_analytics(assignment_number: int, db: Session = Depends(get_db)):
+    """Grade distribution, percentiles, per-group means and per-test pass rates."""
+    return get_stats_or_404(db, assignment_number)
+
+
 @router.get("/assignment/{assignment_number}/{user_id}", response_class=HTMLResponse)
-async def grade_assignment_form(request: Request, assignment_number: int, user_id: str, db: Session = Depends(get_db)):
-    student = db.query(Student).filter(Student.UserID == user_id).first()
-    assignment = db.query(Assignment).filter(
-        Assignment.id == assignment_number).first()
+async def grade_assignment_form(request: Request, assignment_number: int, user_id: str, db: AsyncSession = Depends(get_async_db)):
+    student = await db.get(Student, user_id)
+    assignment = await get_assignment_async(db, assignment_number)
 
     if not student or not assignment:
         raise HTTPException(
             status_code=404, detail="Student or assignment not found")
 
-    submission = db.query(Submission).filter(
+    submission = await db.scalar(select(Submission).filter(
         Submission.assignment_id == assignment_number,
         Submission.student_id == user_id
-    ).first()
+    ))
 
     submission_data = {
         "grade": submission.grade,
@@ -106,131 +215,144 @@ async def get_submission_details(
     request: Request,
     assignment_number: int,
     user_id: str,
-    background_tasks: BackgroundTasks,
     force_rerender: bool = Query(False),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    student = db.query(Student).filter(Student.UserID == user_id).first()
-    submission = db.query(Submission).filter(
+    student = await db.get(Student, user_id)
+    submission = await db.scalar(select(Submission).filter(
         Submission.assignment_id == assignment_number,
         Submission.student_id == user_id
-    ).first()
-    assignment = db.query(Assignment).filter(
-        Assignment.id == assignment_number).first()
+    ))
+    assignment = await get_assignment_async(db, assignment_number)
 
     if not student or not submission or not assignment:
         raise HTTPException(
             status_code=404, detail="Student, submission, or assignment not found")
 
     file_path = Path(submission.file_path)
-    result_html_path = file_path / 'result.html'
-
-    if result_html_path.exists() and os.path.getmtime(result_html_path) >= os.path.getmtime(file_path) and not force_rerender:
-        html_content = result_html_path.read_text(encoding='utf-8')
-        return HTMLResponse(content=html_content)
-
-    background_tasks.add_task(
-        process_submission,
-        file_path,
-        submission,
-        student,
-        assignment,
-        request.state.user,
-    )
-
-    # # Generate test results
-    # test_cases = assignment.rubric.get('test_cases', {})
-    # files = assignment.rubric.get('files', [])
-    #
-    # runner = TestRunner(submission_folder=file_path, files=files)
-    # tabs = runner.generate_tabs(test_cases=test_cases)
-    #
-    # context = {
-    #     "request": request,
-    #     "assignment_number": assignment_number,
-    #     "user_id": student.UserID,
-    #     "submission": submission,
-    #     "tabs": tabs,
-    #     "username": request.state.user,
-    #     "title": f"Assignment {assignment_number} Submission for {student.Name}",
-    # }
-    # html_content = templates.get_template("test_result.html").render(context)
-    # result_html_path.write_text(html_content, encoding='utf-8')
-
-    return {"status": f"Processing submission of {student.UserID} in background"}
-
-
-def process_submission(file_path, submission, student, assignment, user):
-    logger.info(f"Processing submission for student: {student.Name}")
-    test_cases = assignment.rubric.get('test_cases', {})
-    files = assignment.rubric.get('files', [])
-
-    runner = TestRunner(submission_folder=file_path, files=files)
-    tabs = runner.generate_tabs(test_cases=test_cases)
-
-    result_html_path = file_path / 'result.html'
-
-    context = {
-        "assignment_number": submission.assignment_id,
-        "user_id": student.UserID,
-        "submission": submission,
-        "tabs": tabs,
-        "username": user,
-        "title": f"Assignment {submission.assignment_id} Submission for {student.Name}",
+    directory = results_dir(file_path)
+    # File reads run in the threadpool, off the event loop
+    manifest = await run_in_threadpool(read_manifest, directory)
+
+    if is_fresh(manifest, submission, assignment) and not force_rerender:
+        return await run_in_threadpool(
+            artifact_response, request, directory, manifest, 'result.html', "text/html")
+
+    job, created = await db.run_sync(
+        jobs.enqueue_render, submission, render_key(submission, assignment), request.state.user, force_rerender)
+
+    return {
+        "status": f"Processing submission of {student.UserID} in background" if created
+        else f"Submission of {student.UserID} is already being processed",
+        "job_id": job.id,
+        "job_url": f"/grade/jobs/{job.id}",
     }
 
-    html_content = templates.get_template("test_result.html").render(context)
-    result_html_path.write_text(html_content, encoding='utf-8')
-
-
-async def process_submissions_in_background(user, submissions, assignment, db):
-    tasks = []
-    loop = asyncio.get_running_loop()
-    with ProcessPoolExecutor() as pool:
-        for submission in submissions:
-            file_path = Path(submission.file_path)
-            student = db.query(Student).filter(
-                Student.UserID == submission.student_id).first()
-
-            if file_path.exists() and student:
-                tasks.append(loop.run_in_executor(
-                    pool,
-                    process_submission,
-                    file_path,
-                    submission,
-                    student,
-                    assignment,
-                    user
-                ))
-            else:
-                logger.error(f"Missing file or student for submission: {
-                             submission.student_id}")
-
-        await asyncio.gather(*tasks)
-
-
-@ router.post("/assignment/process-submissions", response_class=JSONResponse)
-async def process_all_submissions(
+
+def artifact_response(request: Request, directory: Path, manifest: dict, name: str, media_type: str):
+    """Serve a gzipped result artifact, or 304 when the client already holds this version.
+
+    Reads the file, so async routes call it through ``run_in_threadpool``.
+    """
+    entry = manifest["artifacts"].get(name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+
+    # The gzip and identity bodies differ, so each gets its own strong ETag
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    etag = f'"{entry["etag"]}-gz"' if gzipped else f'"{entry["etag"]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    path = artifact_path(directory, manifest, name)
+    if not path.exists():
+        # Replaced by a newer render since the manifest was read
+        raise HTTPException(status_code=404, detail=f"{name} is out of date")
+    if gzipped:
+        return FileResponse(path, media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(gzip.decompress(path.read_bytes()), media_type=media_type, headers=headers)
+
+
+def get_results(db: Session, assignment_number: int, user_id: str):
+    submission = db.query(Submission.file_path).filter(
+        Submission.assignment_id == assignment_number,
+        Submission.student_id == user_id
+    ).first()
+    if not submission:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    directory = results_dir(submission.file_path)
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise HTTPException(
+            status_code=404, detail="Submission has not been rendered yet")
+    return directory, manifest
+
+
+@router.get("/assignment/{assignment_number}/{user_id}/submission/tabs", response_class=JSONResponse)
+def get_submission_tabs(request: Request, assignment_number: int, user_id: str, db: Session = Depends(get_db)):
+    """Metadata for every tab of a rendered submission, without outputs or code."""
+    directory, manifest = get_results(db, assignment_number, user_id)
+    return artifact_response(request, directory, manifest, 'index.json', "application/json")
+
+
+@router.get("/assignment/{assignment_number}/{user_id}/submission/tabs/{tab_index}", response_class=JSONResponse)
+def get_submission_tab(request: Request, assignment_number: int, user_id: str, tab_index: int, db: Session = Depends(get_db)):
+    directory, manifest = get_results(db, assignment_number, user_id)
+    return artifact_response(request, directory, manifest, f"{tab_index}.json", "application/json")
+
+
+@router.post("/assignment/process-submissions", response_class=JSONResponse)
+def process_all_submissions(
     request: Request,
-    background_tasks: BackgroundTasks,
     assignment_number: int = Query(...),
     db: Session = Depends(get_db)
 ):
-    submissions = db.query(Submission).filter(
-        Submission.assignment_id == assignment_number).all()
-    assignment = db.query(Assignment).filter(
-        Assignment.id == assignment_number).first()
+    assignment = get_assignment(db, assignment_number)
+    has_submissions = db.query(Submission.id).filter(
+        Submission.assignment_id == assignment_number).first()
 
-    if not submissions or not assignment:
+    if not has_submissions or not assignment:
         raise HTTPException(
             status_code=404, detail="No submissions or assignment found")
 
-    background_tasks.add_task(
-        process_submissions_in_background,
-        request.state.user,
-        submissions,
-        assignment,
-        db
-    )
+    job, created = jobs.enqueue_grading(
+        db, assignment_number, request.state.user)
+
+    return {
+        "status": "Processing submissions in background" if created else "Submissions are already being processed",
+        "job_id": job.id,
+    }
+
+
+@router.get("/jobs", response_class=JSONResponse)
+def list_jobs(assignment_number: int = Query(None), limit: int = 20, db: Session = Depends(get_db)):
+    query = db.query(Job)
+    if assignment_number is not None:
+        query = query.filter(Job.assignment_id == assignment_number)
+
+    listed = query.order_by(Job.id.desc()).limit(limit).all()
+    counts = jobs.task_counts(db, [job.id for job in listed])
+    return [jobs.job_status(db, job, counts[job.id]) for job in listed]
+
+
+@router.get("/jobs/{job_id}", response_class=JSONResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    status = jobs.job_status(db, job)
+    status["tasks"] = jobs.task_progress(db, job.id)
+    return status
+
+
+@router.post("/jobs/{job_id}/cancel", response_class=JSONResponse)
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    return {"status": "Processing submissions in background"}
+    return jobs.job_status(db, jobs.cancel_job(db, job))
@@ -1,66 +1,72 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-from app import UNZIP_DIR, UPLOAD_DIR
-from app.utils import parser, organizer
-from app.database import get_db
+from app import UPLOAD_DIR, UPLOAD_CHUNK_SIZE
+from app.utils import parser, jobs
+from app.database import get_async_db
 from app.models import Assignment
+from app.utils.assignments import invalidate_assignment
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
 import json
 import logging
 import zipfile
-import shutil
 
 
 logger = logging.getLogger('uvicorn.error')
 router = APIRouter(tags=["upload"])
 
 
-def handle_rubric_file(rubric_file: UploadFile):
+async def save_upload(upload: UploadFile, destination: Path):
+    """Stream an upload to disk in chunks without blocking the event loop."""
+    partial = destination.with_name(destination.name + ".part")
+    buffer = await run_in_threadpool(open, partial, "wb")
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await run_in_threadpool(buffer.write, chunk)
+    finally:
+        await run_in_threadpool(buffer.close)
+
+    await run_in_threadpool(os.replace, partial, destination)
+    return destination
+
+
+async def handle_rubric_file(rubric_file: UploadFile):
     if not rubric_file.filename.endswith(".json"):
         raise HTTPException(
             status_code=400, detail="Only .json files are allowed for the rubric")
 
-    rubric_file_location = UPLOAD_DIR / rubric_file.filename
-    with open(rubric_file_location, "wb") as buffer:
-        shutil.copyfileobj(rubric_file.file, buffer)
+    rubric_file_location = await save_upload(
+        rubric_file, UPLOAD_DIR / rubric_file.filename)
 
-    with open(rubric_file_location, "r") as rubric_file:
-        try:
-            rubric_content = json.load(rubric_file)
-        except json.JSONDecodeError:
-            raise HTTPException(
-                status_code=400, detail="Invalid JSON format in the rubric file")
+    try:
+        rubric_content = json.loads(
+            await run_in_threadpool(rubric_file_location.read_bytes))
+    except json.JSONDecodeError:
+        raise HTTPException(
+            status_code=400, detail="Invalid JSON format in the rubric file")
 
     return rubric_content
 
 
-def handle_gradebook_file(gradebook_file: UploadFile):
+async def handle_gradebook_file(gradebook_file: UploadFile, assignment_id: int):
     if not gradebook_file.filename.endswith(".zip"):
         raise HTTPException(
             status_code=400, detail="Only .zip files are allowed for the gradebook")
 
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    gradebook_file_location = UPLOAD_DIR / gradebook_file.filename
-    with open(gradebook_file_location, "wb") as buffer:
-        shutil.copyfileobj(gradebook_file.file, buffer)
-
-    target_path = UNZIP_DIR
-    target_path.mkdir(exist_ok=True)
+    # The stem doubles as the upload id for the extraction root
+    upload_dir = UPLOAD_DIR / f"assignment_{assignment_id}"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    upload_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    gradebook_file_location = await save_upload(
+        gradebook_file, upload_dir / f"{upload_id}_{Path(gradebook_file.filename).name}")
 
-    try:
-        with zipfile.ZipFile(gradebook_file_location, 'r') as zip_ref:
-            zip_ref.extractall(target_path)
-    except zipfile.BadZipFile:
+    if not await run_in_threadpool(zipfile.is_zipfile, gradebook_file_location):
         raise HTTPException(status_code=400, detail="Invalid zip file")
 
-    return target_path
-
-
-def organize_files(target_path: Path, assignment_id: int):
-    org = organizer.Organizer(target_path, assignment_id)
-    org.organize()
+    return gradebook_file_location
 
 
 def parse_due_date(due_date_str: str):
@@ -78,15 +84,14 @@ async def upload_all(
     dueDate: str = Form(...),
     rubricFile: UploadFile = File(...),
     gradebookFile: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if the assignment already exists in the database
-    existing_assignment = db.query(
-        Assignment).filter_by(id=assignmentId).first()
+    existing_assignment = await db.get(Assignment, assignmentId)
 
     if not existing_assignment:
         # If the assignment doesn't exist, handle rubric and due date
-        rubric_content = handle_rubric_file(rubricFile)
+        rubric_content = await handle_rubric_file(rubricFile)
         due_date_parsed = parse_due_date(dueDate)
 
         # Create a new assignment
@@ -99,38 +104,39 @@ async def upload_all(
 
         # Add the new assignment to the database
         db.add(new_assignment)
-        db.commit()
-        db.refresh(new_assignment)
+        await db.commit()
+        invalidate_assignment(assignmentId)
+        await db.refresh(new_assignment)
         logger.info(f"New assignment created: {
                     assignmentName} with ID {assignmentId}")
     else:
         logger.info(f"Assignment already exists: {
                     existing_assignment.name} with ID {assignmentId}")
 
-    # Process the gradebook file
-    target_path = handle_gradebook_file(gradebookFile)
-
-    # Organize the files and link them to the assignment
-    organize_files(target_path, assignmentId)
+    # Save the gradebook file, extraction and organization run as a job
+    gradebook_path = await handle_gradebook_file(gradebookFile, assignmentId)
+    job = await db.run_sync(jobs.enqueue_ingest, assignmentId, gradebook_path)
 
-    # Return a success message
+    # Return a handle to track the ingest
     return JSONResponse(content={
-        "status": "Assignment and files uploaded successfully",
+        "status": "Assignment uploaded, gradebook is being processed",
         "assignmentId": assignmentId,
         "assignmentName": assignmentName,
-        "dueDate": dueDate
+        "dueDate": dueDate,
+        "job_id": job.id,
+        "job_url": f"/grade/jobs/{job.id}"
     })
 
 
 @router.post("/group/")
-async def upload_group(groupFile: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_group(groupFile: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     if not groupFile.filename.endswith(".txt"):
         return JSONResponse(content={"error": "Only .txt files are allowed"}, status_code=400)
 
     content = await groupFile.read()
 
     class_data = parser.parse_group_file(content.decode("utf-8"))
-    parser.insert_group_data(db, class_data)
+    await db.run_sync(parser.insert_group_data, class_data)
 
     return JSONResponse(content={"status": "Group.txt uploaded and processed successfully"})
 
@@ -138,13 +144,21 @@ async def upload_group(groupFile: UploadFile = File(...), db: Session = Depends(
 @router.post("/gradebook/")
 async def upload_gradebook(
     assignmentId: int = Form(...),
-    gradebookFile: UploadFile = File(...)
+    gradebookFile: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    target_path = handle_gradebook_file(gradebookFile)
+    # The ingest job references the assignment
+    if await db.get(Assignment, assignmentId) is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
 
-    organize_files(target_path, assignmentId)
+    gradebook_path = await handle_gradebook_file(gradebookFile, assignmentId)
+    job = await db.run_sync(jobs.enqueue_ingest, assignmentId, gradebook_path)
 
-    return JSONResponse(content={"status": "Gradebook file uploaded and organized successfully"})
+    return JSONResponse(content={
+        "status": "Gradebook file uploaded, processing in background",
+        "job_id": job.id,
+        "job_url": f"/grade/jobs/{job.id}"
+    })
 
 
 @router.post("/rubric/")
@@ -153,14 +167,13 @@ async def upload_rubric(
     assignmentId: int = Form(...),
     dueDate: str = Form(...),
     rubricFile: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    rubric_content = handle_rubric_file(rubricFile)
+    rubric_content = await handle_rubric_file(rubricFile)
 
     due_date_parsed = parse_due_date(dueDate)
 
-    assignment = db.query(Assignment).filter(
-        Assignment.id == assignmentId).first()
+    assignment = await db.get(Assignment, assignmentId)
 
     if assignment:
         assignment.name = assignmentName
@@ -174,9 +187,10 @@ async def upload_rubric(
             due_date=due_date_parsed
         )
         db.add(new_assignment)
-        db.commit()
-        db.refresh(new_assignment)
+        await db.commit()
+        await db.refresh(new_assignment)
 
-    db.commit()
+    await db.commit()
+    invalidate_assignment(assignmentId)
 
     return JSONResponse(content={"status": "Rubric file uploaded and assignment created/updated successfully"})
@@ -1,8 +1,11 @@
 import logging
+from contextlib import asynccontextmanager
 from app.endpoints import upload, grading
 from app.endpoints.crud import crud
 from app.endpoints.middleware import session
-from app.database import engine, Base
+from app.database import engine, async_engine, migrate
+from app.utils.pool import pool_status
+from app.utils.jobs import scheduler
 from app import TEMPLATES, STATIC
 
 from fastapi import status
@@ -17,14 +20,20 @@ from fastapi import FastAPI, Request, HTTPException, Depends
 
 logger = logging.getLogger('uvicorn.error')
 
-try:
-    Base.metadata.create_all(bind=engine)
-except SQLAlchemyError as e:
-    logger.error(f"Error creating database: {e}")
-    raise HTTPException(
-        status_code=500, detail="Database initialization error")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        migrate()
+    except SQLAlchemyError as e:
+        logger.error(f"Error migrating database: {e}")
+        raise
+    scheduler.start()
+    yield
+    scheduler.stop()
+    await async_engine.dispose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 
 async def get_current_user(request: Request):
@@ -71,6 +80,15 @@ async def http_exception_handler(request, exc):
     )
 
 
+@app.get("/metrics/db-pool", dependencies=[Depends(get_current_user)])
+async def db_pool_metrics():
+    """Connection pool occupancy and checkout wait times for this process."""
+    return {
+        "sync": pool_status(engine),
+        "async": pool_status(async_engine.sync_engine),
+    }
+
+
 @app.get("/", response_class=HTMLResponse, dependencies=[Depends(get_current_user)])
 async def read_homepage(request: Request):
     return templates.TemplateResponse(
@@ -0,0 +1,47 @@
+from alembic import context
+from app.database import engine, Base
+import app.models  # noqa: F401
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # GIN indexes are only built on Postgres
+    if type_ == "index" and object.dialect_options["postgresql"]["using"]:
+        return context.get_bind().dialect.name == "postgresql"
+    return True
+
+
+def run_migrations_offline():
+    context.configure(
+        url=engine.url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # app.database.migrate() hands over the connection it holds the lock on
+    connection = context.config.attributes.get("connection")
+    if connection is None:
+        with engine.connect() as connection:
+            run_with(connection)
+    else:
+        run_with(connection)
+
+
+def run_with(connection):
+    context.configure(connection=connection, target_metadata=target_metadata,
+                      include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
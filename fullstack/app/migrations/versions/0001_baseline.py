@@ -0,0 +1,75 @@
+"""Baseline schema, as created by create_all before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 04:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_number', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_groups_id', 'groups', ['id'])
+
+    op.create_table(
+        'assignments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('rubric', sa.JSON(), nullable=False),
+        sa.Column('due_date', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_assignments_id', 'assignments', ['id'])
+
+    op.create_table(
+        'students',
+        sa.Column('UserID', sa.String(), nullable=False),
+        sa.Column('Name', sa.String(), nullable=False),
+        sa.Column('DrexelID', sa.String(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['groups.id']),
+        sa.PrimaryKeyConstraint('UserID'),
+    )
+    op.create_index('ix_students_UserID', 'students', ['UserID'])
+
+    op.create_table(
+        'submissions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('grade', sa.Float(), nullable=True),
+        sa.Column('submission_date', sa.DateTime(timezone=True),
+                  server_default=sa.func.now(), nullable=True),
+        sa.Column('feedback', sa.JSON(), nullable=False),
+        sa.Column('test_cases', sa.JSON(), nullable=False),
+        sa.Column('file_path', sa.String(), nullable=False),
+        sa.Column('student_id', sa.String(), nullable=False),
+        sa.Column('assignment_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id']),
+        sa.ForeignKeyConstraint(['student_id'], ['students.UserID']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('student_id', 'assignment_id',
+                            name='_student_assignment_uc'),
+    )
+    op.create_index('ix_submissions_id', 'submissions', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_table('submissions')
+    op.drop_table('students')
+    op.drop_table('assignments')
+    op.drop_table('groups')
@@ -0,0 +1,62 @@
+"""Add jobs and job_tasks for background grading
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 04:21:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created by create_all once jobs existed already have both
+    if sa.inspect(op.get_bind()).has_table('jobs'):
+        return
+
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('requested_by', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True),
+                  server_default=sa.func.now(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('assignment_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_jobs_id', 'jobs', ['id'])
+    op.create_index('ix_jobs_status', 'jobs', ['status'])
+
+    op.create_table(
+        'job_tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('submission_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['jobs.id']),
+        sa.ForeignKeyConstraint(['submission_id'], ['submissions.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_job_tasks_id', 'job_tasks', ['id'])
+    op.create_index('ix_job_tasks_status', 'job_tasks', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_table('job_tasks')
+    op.drop_table('jobs')
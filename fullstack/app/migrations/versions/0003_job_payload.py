@@ -0,0 +1,28 @@
+"""Add jobs.payload for ingest job arguments
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 04:22:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = sa.inspect(op.get_bind()).get_columns('jobs')
+    if 'payload' not in {column['name'] for column in columns}:
+        op.add_column('jobs', sa.Column('payload', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('jobs', 'payload')
@@ -0,0 +1,35 @@
+"""Add submissions.fingerprint so re-uploads skip unchanged submissions
+
+The fingerprint of a student's gradebook members is compared on upload
+to skip extracting an attempt that hasn't changed, and is part of
+render_key so a changed attempt gets re-rendered. The test runner also uses
+it as the content hash in its result cache keys.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 04:23:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created by create_all after the column was added already have it
+    columns = sa.inspect(op.get_bind()).get_columns('submissions')
+    if 'fingerprint' not in {column['name'] for column in columns}:
+        op.add_column('submissions',
+                      sa.Column('fingerprint', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('submissions', 'fingerprint')
@@ -0,0 +1,60 @@
+"""Index submission and job lookups, store test results as JSONB on Postgres
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 04:25:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (student_id, assignment_id) lookups already use _student_assignment_uc
+INDEXES = [
+    ('ix_submissions_assignment_id', 'submissions', ['assignment_id']),
+    ('ix_jobs_assignment_id', 'jobs', ['assignment_id']),
+    ('ix_job_tasks_job_id', 'job_tasks', ['job_id']),
+    ('ix_job_tasks_submission_id', 'job_tasks', ['submission_id']),
+]
+JSONB_COLUMNS = ['feedback', 'test_cases']
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for column in JSONB_COLUMNS:
+        op.alter_column('submissions', column,
+                        type_=postgresql.JSONB(),
+                        postgresql_using=f'{column}::jsonb')
+    # For containment filters on the marks, which are shaped
+    # {file: {function: {case: true/false/null}}}, e.g. the submissions
+    # that got one case wrong:
+    #   test_cases @> '{"p1.py": {"bfs": {"case3": false}}}'
+    # Nothing filters this way yet; the per-test summaries read test_results.
+    op.create_index('ix_submissions_test_cases', 'submissions', ['test_cases'],
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_submissions_test_cases', 'submissions')
+        for column in JSONB_COLUMNS:
+            op.alter_column('submissions', column,
+                            type_=sa.JSON(),
+                            postgresql_using=f'{column}::json')
+
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table)
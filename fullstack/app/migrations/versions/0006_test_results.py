@@ -0,0 +1,80 @@
+"""Add test_results, one row per test case of a submission
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 04:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copies of app.utils.test_results as of this revision, so later changes
+# there don't change what this backfill writes
+SCORES = {"correct": 1.0, "incorrect": 0.0}
+
+
+def flatten(test_cases, path=()):
+    for key, value in (test_cases or {}).items():
+        if isinstance(value, dict):
+            yield from flatten(value, path + (key,))
+        else:
+            yield " ".join(path + (key,)), value
+
+
+def verdict(value):
+    if value is True:
+        return "correct"
+    if value is False:
+        return "incorrect"
+    return "ungraded"
+
+
+def upgrade() -> None:
+    test_results = op.create_table(
+        'test_results',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('test_case', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=True),
+        sa.Column('run_status', sa.String(), nullable=True),
+        sa.Column('duration', sa.Float(), nullable=True),
+        sa.Column('output_hash', sa.String(), nullable=True),
+        sa.Column('submission_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['submission_id'], ['submissions.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('submission_id', 'test_case',
+                            name='_submission_test_case_uc'),
+    )
+    op.create_index('ix_test_results_id', 'test_results', ['id'])
+    op.create_index('ix_test_results_test_case_status',
+                    'test_results', ['test_case', 'status'])
+
+    # Existing grading lives only in the submissions' test_cases
+    submissions = sa.table('submissions', sa.column('id'),
+                           sa.column('test_cases', sa.JSON()))
+    rows = []
+    for submission_id, test_cases in op.get_bind().execute(
+            sa.select(submissions.c.id, submissions.c.test_cases)):
+        for name, value in flatten(test_cases):
+            rows.append({
+                "submission_id": submission_id,
+                "test_case": name,
+                "status": verdict(value),
+                "score": SCORES.get(verdict(value)),
+            })
+    if rows:
+        op.bulk_insert(test_results, rows)
+
+
+def downgrade() -> None:
+    op.drop_table('test_results')
@@ -0,0 +1,46 @@
+"""Delete job rows along with their assignment or submission
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 05:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEYS = [
+    ('jobs', 'assignment_id', 'assignments', 'id'),
+    ('job_tasks', 'job_id', 'jobs', 'id'),
+    ('job_tasks', 'submission_id', 'submissions', 'id'),
+]
+# SQLite reflects foreign keys without names, batch mode names them by this
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def set_ondelete(ondelete):
+    inspector = sa.inspect(op.get_bind())
+    for table, column, referent, remote in FOREIGN_KEYS:
+        existing = next(fk for fk in inspector.get_foreign_keys(table)
+                        if fk['constrained_columns'] == [column])
+        name = existing['name'] or f'fk_{table}_{column}_{referent}'
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            batch.drop_constraint(name, type_='foreignkey')
+            batch.create_foreign_key(name, referent, [column], [remote],
+                                     ondelete=ondelete)
+
+
+def upgrade() -> None:
+    set_ondelete('CASCADE')
+
+
+def downgrade() -> None:
+    set_ondelete(None)
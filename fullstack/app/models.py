@@ -6,12 +6,18 @@ from sqlalchemy import (
     DateTime,
     JSON,
     Float,
+    Index,
     UniqueConstraint
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
 from sqlalchemy.sql import func
 
+# Stored as JSONB on Postgres, so it can be indexed and queried by key.
+# JSONB sorts object keys, see app.utils.test_results.in_rubric_order
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 
 class Submission(Base):
     __tablename__ = "submissions"
@@ -20,20 +26,54 @@ class Submission(Base):
     grade = Column(Float, nullable=True)
     submission_date = Column(DateTime(timezone=True),
                              server_default=func.now())
-    feedback = Column(JSON, nullable=False)
-    test_cases = Column(JSON, nullable=False)
+    feedback = Column(JSONDocument, nullable=False)
+    test_cases = Column(JSONDocument, nullable=False)
     file_path = Column(String, nullable=False)  # Column to store file path
+    # Hash of the student's attempt file and archive members in the gradebook
+    fingerprint = Column(String, nullable=True)
 
     student_id = Column(String, ForeignKey("students.UserID"), nullable=False)
     assignment_id = Column(Integer, ForeignKey(
-        "assignments.id"), nullable=False)
+        "assignments.id"), nullable=False, index=True)
 
     student = relationship("Student", back_populates="submissions")
     assignment = relationship("Assignment", back_populates="submissions")
+    test_results = relationship("TestResult", back_populates="submission",
+                                cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         UniqueConstraint('student_id', 'assignment_id',
                          name='_student_assignment_uc'),
+        Index('ix_submissions_test_cases', 'test_cases',
+              postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
+
+class TestResult(Base):
+    """One row per test case of a submission, mirroring its test_cases JSON."""
+    __tablename__ = "test_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # The test's path in the rubric joined by spaces, e.g. "p1.py bfs case3"
+    test_case = Column(String, nullable=False)
+    # correct, incorrect or ungraded, as marked by the grader
+    status = Column(String, nullable=False, default="ungraded")
+    score = Column(Float, nullable=True)
+    # How the last run ended (see RunResult.status), its length in
+    # seconds and a hash of its stdout
+    run_status = Column(String, nullable=True)
+    duration = Column(Float, nullable=True)
+    output_hash = Column(String, nullable=True)
+
+    submission_id = Column(Integer, ForeignKey(
+        "submissions.id", ondelete="CASCADE"), nullable=False)
+
+    submission = relationship("Submission", back_populates="test_results")
+
+    __table_args__ = (
+        UniqueConstraint('submission_id', 'test_case',
+                         name='_submission_test_case_uc'),
+        Index('ix_test_results_test_case_status', 'test_case', 'status'),
     )
 
 
@@ -44,6 +84,10 @@ class Assignment(Base):
     name = Column(String, nullable=False)
     rubric = Column(JSON, nullable=False)
     due_date = Column(DateTime, nullable=False)
+    # Bumped by every write that changes the assignment's grades, see
+    # app.utils.analytics.grades_changed
+    grades_version = Column(Integer, nullable=False,
+                            default=0, server_default="0")
 
     submissions = relationship("Submission", back_populates="assignment")
 
@@ -67,3 +111,42 @@ class Group(Base):
     group_number = Column(Integer, nullable=False)
 
     students = relationship("Student", back_populates="group")
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    # pending, running, done, failed or cancelled
+    status = Column(String, nullable=False, default="pending", index=True)
+    requested_by = Column(String, nullable=True)
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    assignment_id = Column(Integer, ForeignKey(
+        "assignments.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    assignment = relationship("Assignment")
+    tasks = relationship("JobTask", back_populates="job",
+                         order_by="JobTask.id")
+
+
+class JobTask(Base):
+    __tablename__ = "job_tasks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    job_id = Column(Integer, ForeignKey(
+        "jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    submission_id = Column(Integer, ForeignKey(
+        "submissions.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    job = relationship("Job", back_populates="tasks")
+    submission = relationship("Submission")
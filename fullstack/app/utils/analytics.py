@@ -0,0 +1,169 @@
+import threading
+import cachetools
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import ANALYTICS_CACHE_SIZE, ANALYTICS_HISTOGRAM_BINS
+from app.models import Assignment, Submission, Student, Group, TestResult
+
+PERCENTILES = [10, 25, 50, 75, 90]
+UNGROUPED = -1
+
+# assignment id -> (grades_version, stats)
+stats_cache = cachetools.LRUCache(maxsize=ANALYTICS_CACHE_SIZE)
+stats_lock = threading.Lock()
+
+
+def grades_changed(db: Session, assignment_id: int = None):
+    """Invalidate cached analytics of one assignment, or of all of them when it is None.
+
+    Call it in the transaction making the change, so every process sees
+    the new version together with the new grades.
+    """
+    query = db.query(Assignment)
+    if assignment_id is not None:
+        query = query.filter(Assignment.id == assignment_id)
+    query.update({Assignment.grades_version: Assignment.grades_version + 1},
+                 synchronize_session=False)
+
+
+def assignment_stats(db: Session, assignment_id: int):
+    """Analytics for one assignment, or None if it does not exist."""
+    version = db.query(Assignment.grades_version).filter(
+        Assignment.id == assignment_id).scalar()
+    if version is None:
+        return None
+
+    with stats_lock:
+        cached = stats_cache.get(assignment_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    stats = compute_stats(load_columns(db, assignment_id))
+    with stats_lock:
+        stats_cache[assignment_id] = (version, stats)
+    return stats
+
+
+def load_columns(db: Session, assignment_id: int):
+    """Every submission's grade and group with each of its test results, as one array per column."""
+    rows = db.execute(select(
+        Submission.id,
+        Submission.grade,
+        Group.group_number,
+        TestResult.test_case,
+        TestResult.status,
+        TestResult.run_status,
+    ).join(Student, Submission.student_id == Student.UserID).outerjoin(
+        Group, Student.group_id == Group.id
+    ).outerjoin(
+        TestResult, TestResult.submission_id == Submission.id
+    ).where(Submission.assignment_id == assignment_id)).all()
+
+    columns = list(zip(*rows)) or [()] * 6
+    submission_ids, grades, groups, tests, statuses, run_statuses = (
+        np.array(column, dtype=object) for column in columns)
+    return {
+        "submission_id": submission_ids.astype(np.int64),
+        "grade": grades.astype(float),
+        "group": np.where(groups == None, UNGROUPED, groups).astype(np.int64),  # noqa: E711
+        "test_case": tests,
+        "status": statuses,
+        "run_status": run_statuses,
+    }
+
+
+def number(value):
+    return None if np.isnan(value) else float(value)
+
+
+def ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def compute_stats(columns):
+    # A submission repeats once per test result, keep its first row
+    _, first = np.unique(columns["submission_id"], return_index=True)
+    grades = columns["grade"][first]
+    groups = columns["group"][first]
+    graded = ~np.isnan(grades)
+
+    return {
+        "submissions": int(first.size),
+        "graded": int(graded.sum()),
+        "grades": grade_stats(grades[graded]),
+        "groups": group_stats(groups, grades, graded),
+        "tests": test_stats(columns),
+    }
+
+
+def grade_stats(grades):
+    if not grades.size:
+        return None
+
+    counts, edges = np.histogram(grades, bins=ANALYTICS_HISTOGRAM_BINS)
+    return {
+        "mean": float(grades.mean()),
+        "std": float(grades.std()),
+        "min": float(grades.min()),
+        "max": float(grades.max()),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(grades, PERCENTILES).tolist())),
+        "histogram": [
+            {"low": float(low), "high": float(high), "count": int(count)}
+            for low, high, count in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+
+def group_stats(groups, grades, graded):
+    numbers, index = np.unique(groups, return_inverse=True)
+    submissions = np.bincount(index, minlength=numbers.size)
+    counted = np.bincount(index, weights=graded, minlength=numbers.size)
+    totals = np.bincount(index, weights=np.where(graded, grades, 0), minlength=numbers.size)
+    means = ratio(totals, counted)
+
+    return [
+        {
+            "group": "Ungrouped" if group == UNGROUPED else int(group),
+            "submissions": int(count),
+            "graded": int(graded_count),
+            "mean": number(mean),
+        }
+        # Numbered groups first, then "Ungrouped"
+        for group, count, graded_count, mean in sorted(
+            zip(numbers, submissions, counted, means), key=lambda row: (row[0] == UNGROUPED, row[0]))
+    ]
+
+
+def test_stats(columns):
+    has_test = columns["test_case"] != None  # noqa: E711
+    if not has_test.any():
+        return []
+
+    names, index = np.unique(columns["test_case"][has_test].astype(str), return_inverse=True)
+    status = columns["status"][has_test]
+    run_status = columns["run_status"][has_test]
+
+    def count(mask):
+        return np.bincount(index, weights=mask, minlength=names.size)
+
+    correct = count(status == "correct")
+    incorrect = count(status == "incorrect")
+    ran = count(run_status != None)  # noqa: E711
+    ran_ok = count(run_status == "ok")
+    pass_rates = ratio(correct, correct + incorrect)
+    run_ok_rates = ratio(ran_ok, ran)
+
+    return [
+        {
+            "test_case": str(name),
+            "total": int(total),
+            "correct": int(correct_count),
+            "incorrect": int(incorrect_count),
+            "pass_rate": number(pass_rate),
+            "run_ok_rate": number(run_ok_rate),
+        }
+        for name, total, correct_count, incorrect_count, pass_rate, run_ok_rate in zip(
+            names, np.bincount(index, minlength=names.size), correct, incorrect, pass_rates, run_ok_rates)
+    ]
@@ -0,0 +1,57 @@
+import threading
+import cachetools
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import ASSIGNMENT_CACHE_SIZE, ASSIGNMENT_CACHE_TTL
+from app.models import Assignment
+
+
+class CachedAssignment(NamedTuple):
+    """Detached copy of an Assignment row; its rubric is shared, treat it as read-only."""
+    id: int
+    name: str
+    rubric: dict
+    due_date: datetime
+
+
+assignment_cache = cachetools.TTLCache(
+    maxsize=ASSIGNMENT_CACHE_SIZE, ttl=ASSIGNMENT_CACHE_TTL)
+assignment_lock = threading.Lock()
+
+
+def cached_assignment(assignment_id: int):
+    with assignment_lock:
+        return assignment_cache.get(assignment_id)
+
+
+def get_assignment(db: Session, assignment_id: int):
+    """The assignment from this process's cache, loading it on a miss; None if it does not exist."""
+    assignment = cached_assignment(assignment_id)
+    if assignment is not None:
+        return assignment
+
+    row = db.query(Assignment.id, Assignment.name, Assignment.rubric, Assignment.due_date).filter(
+        Assignment.id == assignment_id).first()
+    # Misses are not cached, an upload may create the assignment next
+    if row is None:
+        return None
+
+    assignment = CachedAssignment(*row)
+    with assignment_lock:
+        assignment_cache[assignment_id] = assignment
+    return assignment
+
+
+async def get_assignment_async(db: AsyncSession, assignment_id: int):
+    return cached_assignment(assignment_id) or await db.run_sync(get_assignment, assignment_id)
+
+
+def invalidate_assignment(assignment_id: int):
+    """Drop the cached copy after the assignment is changed or deleted.
+
+    Other processes keep theirs until it expires.
+    """
+    with assignment_lock:
+        assignment_cache.pop(assignment_id, None)
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+import logging
+
+logger = logging.getLogger('uvicorn.error')
+
+
+def atomic_write(path: Path, data: bytes):
+    """Write via a temporary file in the same directory, so readers see the old or new file, never half of one."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def hash_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """JSON values stored under content keys, evicted least-recently-used first once over max_bytes.
+
+    Entries are plain files, so every worker process can share one cache directory.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # Force a size check on the first write of every process
+        self.written = max_bytes
+
+    def path(self, key):
+        return self.directory / key[:2] / key
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            value = json.loads(path.read_bytes())
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def set(self, key, value):
+        path = self.path(key)
+        data = json.dumps(value).encode()
+        try:
+            path.parent.mkdir(exist_ok=True)
+            atomic_write(path, data)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {path}: {e}")
+            return
+
+        with self.lock:
+            self.written += len(data)
+            if self.written < self.max_bytes // 10:
+                return
+            self.written = 0
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        # Trim to 90% so we don't rescan on every write near the limit
+        target = self.max_bytes * 9 // 10
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        logger.info(f"Evicted cache entries in {self.directory}, now {total} bytes")
@@ -0,0 +1,57 @@
+import os
+from app import OUTPUT_HEAD_BYTES, OUTPUT_TAIL_BYTES
+
+
+class OutputBuffer:
+    """Keeps the first ``head`` and last ``tail`` bytes of a stream and counts everything in between.
+
+    Memory stays at head + tail bytes however much is written.
+    """
+
+    def __init__(self, head=OUTPUT_HEAD_BYTES, tail=OUTPUT_TAIL_BYTES):
+        self.head_size = head
+        self.tail_size = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_size - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_size:
+                del self.tail[:len(self.tail) - self.tail_size]
+
+    @property
+    def omitted(self):
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self):
+        head = self.head.decode(errors='replace')
+        tail = self.tail.decode(errors='replace')
+        if not self.omitted:
+            return head + tail
+        return f"{head}\n... {self.omitted} bytes omitted ...\n{tail}"
+
+    @classmethod
+    def from_file(cls, path, head=OUTPUT_HEAD_BYTES, tail=OUTPUT_TAIL_BYTES):
+        """Read only the head and tail of ``path``, seeking past the middle."""
+        buffer = cls(head, tail)
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            buffer.head += file.read(head)
+            file.seek(max(len(buffer.head), size - tail))
+            buffer.tail += file.read(tail)
+        buffer.total = max(size, len(buffer.head) + len(buffer.tail))
+        return buffer
+
+
+def read_output(path):
+    try:
+        return OutputBuffer.from_file(path).text()
+    except FileNotFoundError:
+        return ''
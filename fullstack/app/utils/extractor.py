@@ -0,0 +1,131 @@
+import tempfile
+from pathlib import Path, PurePosixPath
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, BadZipFile
+import logging
+from app import (
+    EXTRACT_MAX_BYTES,
+    EXTRACT_MAX_ENTRIES,
+    EXTRACT_MAX_RATIO,
+    EXTRACT_MAX_DEPTH,
+    NESTED_SPOOL_BYTES,
+)
+
+logger = logging.getLogger('uvicorn.error')
+
+JUNK_PARTS = {"__MACOSX", "__pycache__", ".DS_Store", ".git", ".idea", ".vscode"}
+JUNK_SUFFIXES = (".pyc", ".pyo")
+CHUNK_SIZE = 64 * 1024
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def is_junk(name: str):
+    parts = PurePosixPath(name.replace("\\", "/")).parts
+    return any(part in JUNK_PARTS or part.startswith("._") for part in parts) \
+        or name.endswith(JUNK_SUFFIXES)
+
+
+class Extractor:
+    """Streams zip members, including zips nested inside zips, straight to their destination.
+
+    Sizes are counted from the bytes actually decompressed rather than the
+    headers, and the running totals are shared by everything one Extractor
+    extracts.
+    """
+
+    def __init__(
+        self,
+        max_bytes=EXTRACT_MAX_BYTES,
+        max_entries=EXTRACT_MAX_ENTRIES,
+        max_ratio=EXTRACT_MAX_RATIO,
+        max_depth=EXTRACT_MAX_DEPTH,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_ratio = max_ratio
+        self.max_depth = max_depth
+        self.total_bytes = 0
+        self.entries = 0
+
+    def safe_path(self, root: Path, name: str):
+        parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts
+                 if part not in ("", ".", "/")]
+        if not parts or ".." in parts:
+            return None
+        return root.joinpath(*parts)
+
+    def check(self, info: ZipInfo):
+        self.entries += 1
+        if self.entries > self.max_entries:
+            raise ExtractionError(
+                f"More than {self.max_entries} archive entries")
+        if info.compress_size and info.file_size / info.compress_size > self.max_ratio:
+            raise ExtractionError(
+                f"{info.filename} expands {info.file_size // info.compress_size}x")
+
+    def copy(self, source, out, info: ZipInfo):
+        written = 0
+        # Compressed size is already bounded by the upload, so the ratio
+        # also caps how much a member may really expand to
+        limit = max(info.file_size, info.compress_size * self.max_ratio)
+
+        while chunk := source.read(CHUNK_SIZE):
+            written += len(chunk)
+            self.total_bytes += len(chunk)
+            if written > limit:
+                raise ExtractionError(
+                    f"{info.filename} is larger than its header claims")
+            if self.total_bytes > self.max_bytes:
+                raise ExtractionError(
+                    f"Extracted more than {self.max_bytes} bytes")
+            out.write(chunk)
+
+    def extract_file(self, zip_ref: ZipFile, info: ZipInfo, destination: Path):
+        self.check(info)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with zip_ref.open(info) as source, open(destination, "wb") as out:
+            self.copy(source, out, info)
+
+    def extract_archive(self, zip_ref: ZipFile, info: ZipInfo, root: Path, depth=0):
+        """Extract the zip stored in ``info`` into ``root``, member by member."""
+        self.check(info)
+        if depth >= self.max_depth:
+            raise ExtractionError(
+                f"{info.filename} nests archives deeper than {self.max_depth}")
+
+        with zip_ref.open(info) as raw:
+            if info.compress_type == ZIP_STORED:
+                # Stored members can be seeked in place
+                self.extract_all(raw, root, depth + 1)
+                return
+
+            # Seeking a deflated stream restarts decompression, so buffer
+            # it, in memory unless it is large
+            with tempfile.SpooledTemporaryFile(max_size=NESTED_SPOOL_BYTES) as spool:
+                self.copy(raw, spool, info)
+                spool.seek(0)
+                self.extract_all(spool, root, depth + 1)
+
+    def extract_all(self, fileobj, root: Path, depth=0):
+        try:
+            nested = ZipFile(fileobj)
+        except BadZipFile:
+            raise ExtractionError("Corrupt nested archive")
+
+        with nested:
+            for member in nested.infolist():
+                if member.is_dir() or is_junk(member.filename):
+                    continue
+
+                destination = self.safe_path(root, member.filename)
+                if destination is None:
+                    logger.warning(f"Skipping unsafe path {member.filename}")
+                    continue
+
+                if destination.suffix == ".zip":
+                    self.extract_archive(
+                        nested, member, destination.parent, depth)
+                else:
+                    self.extract_file(nested, member, destination)
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import queue
+import signal
+import tempfile
+import selectors
+import threading
+import subprocess
+from pathlib import Path
+import logging
+from app import PYTHON, ZYGOTE_POOL_SIZE, ZYGOTE_PRELOAD, ZYGOTE_ACQUIRE_TIMEOUT, OUTPUT_MAX_BYTES
+from app.utils.capture import OutputBuffer, read_output
+
+logger = logging.getLogger('uvicorn.error')
+
+ZYGOTE_SCRIPT = Path(__file__).resolve().parent / "zygote.py"
+CHUNK_SIZE = 64 * 1024
+# How long pipes may stay open after the script's process group is killed
+DRAIN_GRACE = 1.0
+
+
+class ZygoteError(RuntimeError):
+    pass
+
+
+class Zygote:
+    def __init__(self):
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="zygote_")
+        self.stdout_path = Path(self.tmpdir.name, "stdout")
+        self.stderr_path = Path(self.tmpdir.name, "stderr")
+        self.proc = subprocess.Popen(
+            [PYTHON, str(ZYGOTE_SCRIPT)] + ZYGOTE_PRELOAD,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=self.tmpdir.name,
+            text=True,
+            bufsize=1,
+        )
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, script_path, args, limits=None):
+        request = {
+            "script": str(script_path),
+            "args": [str(arg) for arg in args],
+            "stdout": str(self.stdout_path),
+            "stderr": str(self.stderr_path),
+            "limits": limits,
+        }
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+            reply = self.proc.stdout.readline()
+        except (BrokenPipeError, OSError) as e:
+            raise ZygoteError(f"Zygote process is gone: {e}")
+
+        if not reply:
+            raise ZygoteError("Zygote process exited unexpectedly")
+
+        reply = json.loads(reply)
+        return (
+            read_output(self.stdout_path),
+            read_output(self.stderr_path),
+            reply["returncode"],
+            "timeout" if reply["timed_out"] else None,
+            reply["duration"],
+            reply["cpu_time"],
+        )
+
+    def close(self):
+        if self.alive():
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.tmpdir.cleanup()
+
+
+class ZygotePool:
+    """Fixed-size pool of zygotes; each serves one script at a time."""
+
+    def __init__(self, size=ZYGOTE_POOL_SIZE, timeout=ZYGOTE_ACQUIRE_TIMEOUT):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        self.started = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            start = self.idle.empty() and self.started < self.size
+            if start:
+                self.started += 1
+        if start:
+            try:
+                return Zygote()
+            except BaseException:
+                with self.lock:
+                    self.started -= 1
+                raise
+
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise ZygoteError(f"No zygote became free within {self.timeout}s")
+
+    def release(self, zygote):
+        if zygote.alive():
+            self.idle.put(zygote)
+            return
+
+        logger.warning("Replacing dead zygote process")
+        zygote.close()
+        # Called from run's finally, so it must not mask the run's own error
+        try:
+            replacement = Zygote()
+        except Exception:
+            logger.exception("Could not start a replacement zygote")
+            with self.lock:
+                self.started -= 1
+            return
+        self.idle.put(replacement)
+
+    def run(self, script_path, args, limits=None):
+        zygote = self.acquire()
+        try:
+            return zygote.run(script_path, args, limits)
+        finally:
+            self.release(zygote)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().close()
+
+
+def run_batch(script_path, args_list, jobs=1, limits=None):
+    """Run every argv in ``args_list`` against one script from a single harness process."""
+    with tempfile.TemporaryDirectory(prefix="harness_") as tmpdir:
+        requests = [
+            {
+                "script": str(script_path),
+                "args": [str(arg) for arg in args],
+                "stdout": str(Path(tmpdir, f"{index}.out")),
+                "stderr": str(Path(tmpdir, f"{index}.err")),
+                "limits": limits,
+            }
+            for index, args in enumerate(args_list)
+        ]
+        stdin = "".join(json.dumps(request) + "\n" for request in requests)
+
+        proc = subprocess.run(
+            [PYTHON, str(ZYGOTE_SCRIPT), "--batch", str(jobs)] + ZYGOTE_PRELOAD,
+            input=stdin,
+            capture_output=True,
+            cwd=tmpdir,
+            text=True,
+        )
+        replies = proc.stdout.splitlines()
+        if proc.returncode != 0 or len(replies) != len(requests):
+            raise ZygoteError(f"Harness failed for {script_path}: {proc.stderr}")
+
+        results = []
+        for request, reply in zip(requests, replies):
+            reply = json.loads(reply)
+            results.append((
+                read_output(request["stdout"]),
+                read_output(request["stderr"]),
+                reply["returncode"],
+                "timeout" if reply["timed_out"] else None,
+                reply["duration"],
+                reply["cpu_time"],
+            ))
+        return results
+
+
+def run_limited(script_path, args, limits=None, timeout=None, max_bytes=OUTPUT_MAX_BYTES):
+    """Run ``python3 script args`` under ``limits`` in its own process group.
+
+    Returns ``(stdout, stderr, returncode, stopped, duration, cpu_time)``,
+    where ``stopped`` is "timeout" or "output" when the group was killed
+    for running too long or writing more than ``max_bytes`` to one stream.
+    """
+    command = [PYTHON, str(script_path)] + [str(arg) for arg in args]
+    if limits:
+        # The wrapper starts the new session itself
+        command[1:1] = ["-S", str(ZYGOTE_SCRIPT), "--exec", json.dumps(limits)]
+
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=Path(script_path).parent,
+        start_new_session=not limits,
+    )
+    buffers = {proc.stdout: OutputBuffer(), proc.stderr: OutputBuffer()}
+    try:
+        stopped = drain(proc, buffers, timeout, max_bytes)
+    finally:
+        kill_group(proc.pid)
+        # Reaped by hand for its CPU time, which proc.wait() doesn't report
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        duration = time.monotonic() - started
+        proc.stdout.close()
+        proc.stderr.close()
+
+    return (buffers[proc.stdout].text(), buffers[proc.stderr].text(),
+            proc.returncode, stopped, duration, usage.ru_utime + usage.ru_stime)
+
+
+def drain(proc, buffers, timeout, max_bytes):
+    """Read ``proc``'s pipes into ``buffers`` until both close, killing its group when it has to stop."""
+    deadline = time.monotonic() + timeout if timeout else None
+    closing_by = None
+    stopped = None
+
+    with selectors.DefaultSelector() as selector:
+        for stream in buffers:
+            selector.register(stream, selectors.EVENT_READ)
+
+        while selector.get_map():
+            for key, _ in selector.select(0.05):
+                chunk = os.read(key.fd, CHUNK_SIZE)
+                if chunk:
+                    buffers[key.fileobj].write(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+
+            now = time.monotonic()
+            if closing_by is not None:
+                # Something escaped the group and still holds a pipe
+                if now >= closing_by:
+                    break
+                continue
+
+            if any(buffer.total > max_bytes for buffer in buffers.values()):
+                stopped = "output"
+            elif deadline and now >= deadline:
+                stopped = "timeout"
+            elif not exited(proc.pid):
+                continue
+
+            # Background children may still hold the pipes open
+            kill_group(proc.pid)
+            closing_by = now + DRAIN_GRACE
+
+    return stopped
+
+
+def exited(pid):
+    """True once ``pid`` has exited, without reaping it."""
+    return os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+
+
+def kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ZygotePool()
+        return _pool
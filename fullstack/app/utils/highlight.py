@@ -0,0 +1,46 @@
+import hashlib
+import threading
+import cachetools
+import pygments
+from pygments import formatters, lexers
+from app import CACHE_DIR, HIGHLIGHT_MEMORY_BYTES, HIGHLIGHT_CACHE_MAX_BYTES
+from app.utils.cache import DiskCache, hash_key
+
+CODE_STYLE = {
+    "style": "monokai",
+    "noclasses": True,
+    "cssstyles": "font-size: 16px; line-height: 1.5em;",
+}
+
+# Sized by the length of the cached HTML
+memory_cache = cachetools.LRUCache(maxsize=HIGHLIGHT_MEMORY_BYTES, getsizeof=len)
+memory_lock = threading.Lock()
+disk_cache = DiskCache(CACHE_DIR / "highlight", HIGHLIGHT_CACHE_MAX_BYTES)
+
+
+def highlight_key(code: bytes, language, options):
+    return hash_key(hashlib.sha256(code).hexdigest(), language, options, pygments.__version__)
+
+
+def highlight(code: bytes, language="python", **options):
+    """HTML for ``code``, checking this process's LRU, then the shared disk cache, before running Pygments."""
+    options = {**CODE_STYLE, **options}
+    key = highlight_key(code, language, options)
+
+    with memory_lock:
+        html = memory_cache.get(key)
+    if html is None:
+        html = disk_cache.get(key)
+    if html is None:
+        lexer = lexers.get_lexer_by_name(language)
+        formatter = formatters.HtmlFormatter(**options)
+        html = pygments.highlight(code.decode(errors='replace'), lexer, formatter)
+        disk_cache.set(key, html)
+
+    with memory_lock:
+        try:
+            memory_cache[key] = html
+        except ValueError:
+            # Larger than the whole memory tier, keep it on disk only
+            pass
+    return html
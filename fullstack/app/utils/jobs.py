@@ -0,0 +1,392 @@
+import queue
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from app import JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_POLL_INTERVAL
+from app.database import SessionLocal
+from app.models import Job, JobTask, Submission
+from app.utils.render import process_submission, results_dir, read_manifest, is_fresh
+from app.utils.organizer import ingest_gradebook
+from app.utils.test_results import record_runs
+from app.utils.analytics import grades_changed
+
+logger = logging.getLogger('uvicorn.error')
+
+ACTIVE = ("pending", "running")
+FINISHED = ("done", "failed", "cancelled")
+# pg_advisory_xact_lock namespace for enqueue_render, keyed by submission id
+RENDER_LOCK = 1
+# and for enqueue_grading, keyed by assignment id (2 is the migration lock)
+GRADE_LOCK = 3
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+def get_active_job(db: Session, kind: str, assignment_id: int):
+    return db.query(Job).filter(
+        Job.kind == kind,
+        Job.assignment_id == assignment_id,
+        Job.status.in_(ACTIVE)
+    ).order_by(Job.id.desc()).first()
+
+
+def enqueue_grading(db: Session, assignment_id: int, user: str):
+    """Queue one render task per submission, or return the assignment's run already in progress."""
+    # Held until commit, so two requests can't both find no active run
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(GRADE_LOCK, assignment_id)))
+
+    job = get_active_job(db, "grade", assignment_id)
+    if job:
+        db.commit()
+        return job, False
+
+    submission_ids = [row.id for row in db.query(Submission.id).filter(
+        Submission.assignment_id == assignment_id).order_by(Submission.id)]
+
+    job = Job(kind="grade", assignment_id=assignment_id,
+              requested_by=user, status="pending" if submission_ids else "done")
+    job.tasks = [JobTask(submission_id=submission_id, status="pending", attempts=0)
+                 for submission_id in submission_ids]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    scheduler.notify()
+    return job, True
+
+
+def get_active_render(db: Session, submission_id: int, key: str):
+    active = db.query(Job).join(JobTask).filter(
+        Job.kind == "render",
+        Job.status.in_(ACTIVE),
+        JobTask.submission_id == submission_id
+    ).order_by(Job.id.desc())
+    return next((job for job in active if job.payload.get("key") == key), None)
+
+
+def enqueue_render(db: Session, submission: Submission, key: str, user: str, force: bool = False):
+    """Queue a render of one submission, or return the one already running for the same files and rubric.
+
+    ``key`` is the render key of the submission's current content, so a
+    request made after the files or the rubric change starts a new run.
+    """
+    # Held until commit, so concurrent requests from any web process
+    # check for an active render one at a time
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(RENDER_LOCK, submission.id)))
+
+    job = get_active_render(db, submission.id, key)
+    if job:
+        db.commit()
+        return job, False
+
+    job = Job(kind="render", assignment_id=submission.assignment_id, requested_by=user,
+              status="pending", payload={"key": key, "force": force})
+    job.tasks = [JobTask(submission_id=submission.id,
+                         status="pending", attempts=0)]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    scheduler.notify()
+    return job, True
+
+
+def enqueue_ingest(db: Session, assignment_id: int, gradebook_path: Path, user: str = None):
+    """Queue extraction and organization of an uploaded gradebook."""
+    job = Job(kind="ingest", assignment_id=assignment_id, requested_by=user,
+              status="pending", payload={"path": str(gradebook_path)})
+    job.tasks = [JobTask(status="pending", attempts=0)]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    scheduler.notify()
+    return job
+
+
+def cancel_job(db: Session, job: Job):
+    if job.status in FINISHED:
+        return job
+
+    for task in job.tasks:
+        if task.status == "pending":
+            task.status = "cancelled"
+            task.finished_at = now()
+    job.status = "cancelled"
+    job.finished_at = now()
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def task_counts(db: Session, job_ids):
+    """Tasks per status for each of ``job_ids``, in one grouped query."""
+    counts = {job_id: {status: 0 for status in ACTIVE + FINISHED}
+              for job_id in job_ids}
+    rows = db.query(JobTask.job_id, JobTask.status, func.count(JobTask.id)).filter(
+        JobTask.job_id.in_(job_ids)
+    ).group_by(JobTask.job_id, JobTask.status)
+    for job_id, status, count in rows:
+        counts[job_id][status] = count
+    return counts
+
+
+def job_status(db: Session, job: Job, counts: dict = None):
+    if counts is None:
+        counts = task_counts(db, [job.id])[job.id]
+
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "assignment_id": job.assignment_id,
+        "status": job.status,
+        "requested_by": job.requested_by,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "counts": counts,
+        "total": sum(counts.values()),
+    }
+
+
+def get_latest_job(db: Session, kind: str, assignment_id: int):
+    return db.query(Job).filter(
+        Job.kind == kind,
+        Job.assignment_id == assignment_id
+    ).order_by(Job.id.desc()).first()
+
+
+def task_progress(db: Session, job_id: int):
+    rows = db.query(
+        JobTask.id,
+        JobTask.status,
+        JobTask.attempts,
+        JobTask.error,
+        JobTask.started_at,
+        JobTask.finished_at,
+        JobTask.submission_id,
+        Submission.student_id,
+    ).outerjoin(Submission, JobTask.submission_id == Submission.id).filter(
+        JobTask.job_id == job_id
+    ).order_by(JobTask.id).all()
+
+    return [
+        {
+            "task_id": row.id,
+            "submission_id": row.submission_id,
+            "student_id": row.student_id,
+            "status": row.status,
+            "attempts": row.attempts,
+            "error": row.error,
+            "started_at": row.started_at,
+            "finished_at": row.finished_at,
+            "elapsed": (row.finished_at - row.started_at).total_seconds()
+            if row.started_at and row.finished_at else None,
+        }
+        for row in rows
+    ]
+
+
+def run_task(task_id: int):
+    """Runs inside a pool worker, with its own session."""
+    with SessionLocal() as db:
+        task = db.get(JobTask, task_id)
+        if task.job.kind == "ingest":
+            ingest_gradebook(
+                Path(task.job.payload["path"]), task.job.assignment_id)
+            return
+
+        submission = task.submission
+        if submission is None:
+            raise LookupError(f"Submission for task {task_id} no longer exists")
+
+        file_path = Path(submission.file_path)
+        if not file_path.exists():
+            raise FileNotFoundError(f"Missing submission folder {file_path}")
+
+        # Another job may have rendered this content since the request was queued
+        if task.job.kind == "render" and not task.job.payload.get("force") and is_fresh(
+                read_manifest(results_dir(file_path)), submission, submission.assignment):
+            return
+
+        tabs = process_submission(
+            file_path,
+            submission,
+            submission.student,
+            submission.assignment,
+            task.job.requested_by,
+        )
+        record_runs(db, submission.id, tabs)
+        grades_changed(db, submission.assignment_id)
+        db.commit()
+
+
+def finish_job_if_complete(db: Session, job: Job):
+    if job.status in FINISHED:
+        return
+
+    statuses = [task.status for task in job.tasks]
+    if any(status in ACTIVE for status in statuses):
+        return
+
+    job.status = "failed" if "failed" in statuses else "done"
+    job.finished_at = now()
+
+
+class Scheduler:
+    """Claims pending tasks from the database and runs them on a long-lived process pool.
+
+    Task state lives in the database, so a restart re-queues whatever was
+    running and picks up where it left off.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.pool = None
+        self.thread = None
+        self.running = {}
+        self.completed = queue.Queue()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def start(self):
+        self.recover()
+        self.pool = self.new_pool()
+        self.thread = threading.Thread(
+            target=self.loop, name="job-scheduler", daemon=True)
+        self.thread.start()
+        logger.info(f"Job scheduler started with {self.workers} workers")
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def notify(self):
+        self.wakeup.set()
+
+    def new_pool(self):
+        # Spawned workers don't inherit the web process's DB connections
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def recover(self):
+        with SessionLocal() as db:
+            count = db.query(JobTask).filter(JobTask.status == "running").update(
+                {JobTask.status: "pending"}, synchronize_session=False)
+            db.commit()
+        if count:
+            logger.info(f"Re-queued {count} interrupted job tasks")
+
+    def loop(self):
+        while not self.stopping.is_set():
+            try:
+                self.collect()
+                self.dispatch()
+            except Exception as e:
+                logger.error(f"Job scheduler error: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def claim(self, db: Session, limit: int):
+        query = db.query(JobTask).join(Job).filter(
+            JobTask.status == "pending",
+            Job.status.in_(ACTIVE)
+        ).order_by(
+            # Someone is waiting on the page for a single render
+            case((Job.kind == "render", 0), else_=1),
+            JobTask.id
+        ).limit(limit)
+
+        if db.bind.dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True, of=JobTask)
+
+        tasks = query.all()
+        for task in tasks:
+            task.status = "running"
+            task.attempts += 1
+            task.started_at = now()
+            task.job.status = "running"
+        db.commit()
+        return [task.id for task in tasks]
+
+    def dispatch(self):
+        free = self.workers - len(self.running)
+        if free <= 0:
+            return
+
+        with SessionLocal() as db:
+            task_ids = self.claim(db, free)
+
+        for task_id in task_ids:
+            try:
+                future = self.pool.submit(run_task, task_id)
+            except BrokenProcessPool as e:
+                self.completed.put((task_id, e))
+                continue
+            self.running[future] = task_id
+            future.add_done_callback(self.on_done)
+
+    def on_done(self, future):
+        task_id = self.running.pop(future)
+        if future.cancelled():
+            error = BrokenProcessPool("Cancelled by pool shutdown")
+        else:
+            error = future.exception()
+        self.completed.put((task_id, error))
+        self.wakeup.set()
+
+    def collect(self):
+        broken = False
+        with SessionLocal() as db:
+            while not self.completed.empty():
+                task_id, error = self.completed.get()
+                broken |= isinstance(error, BrokenProcessPool)
+                self.complete(db, task_id, error)
+            db.commit()
+
+        if broken:
+            logger.warning("Job worker pool crashed, starting a new one")
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+
+    def complete(self, db: Session, task_id: int, error):
+        task = db.get(JobTask, task_id)
+        if task is None:
+            return
+
+        if task.status == "running":
+            if error is None:
+                task.status = "done"
+                task.error = None
+            elif task.attempts < JOB_MAX_ATTEMPTS:
+                logger.warning(f"Retrying job task {task_id}: {error}")
+                task.status = "pending"
+                task.error = str(error)
+            else:
+                logger.error(f"Job task {task_id} failed: {error}")
+                task.status = "failed"
+                task.error = str(error)
+
+            if task.status != "pending":
+                task.finished_at = now()
+
+        finish_job_if_complete(db, task.job)
+
+
+scheduler = Scheduler()
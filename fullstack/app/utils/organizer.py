@@ -1,67 +1,66 @@
 import re
+import shutil
+import hashlib
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo
 from datetime import datetime
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app import UNZIP_DIR
+from app.database import SessionLocal, bulk_upsert
 from app.models import Submission, Student, Assignment
+from app.utils.extractor import Extractor, ExtractionError, is_junk
+from app.utils.test_results import sync_new_submissions, sync_test_results
+from app.utils.analytics import grades_changed
 import logging
 
 logger = logging.getLogger('uvicorn.error')
 
+USERID_PATTERN = r'_([a-zA-Z]{2,5}\d{2,6})_'
+
 
 class Organizer:
-    def __init__(self, target_path, assignment_id: int):
+    def __init__(self, target_path, assignment_id: int, fingerprints: dict = None):
         self.assignment_id: int = assignment_id
         self.target_path = target_path
-
-    def organize(self):
-        current_dir = Path(self.target_path)
-
-        for filename in current_dir.iterdir():
-            if filename.is_file():
-                self.splitAndStore(filename.name, current_dir)
-
-        for dirName in current_dir.iterdir():
-            if dirName.is_dir() and dirName.name != 'archive':
-                self.unzip_recursive(dirName)
+        self.fingerprints = fingerprints or {}
+        self.extractor = Extractor()
+        # userid -> (submission_date, submission_dir), flushed in one transaction
+        self.parsed = {}
+
+    def organize(self, zip_ref: ZipFile, members: dict):
+        """Stream each student's gradebook members into their folder and register the attempts."""
+        for userid, infos in members.items():
+            try:
+                for info in infos:
+                    self.store_member(zip_ref, info, userid)
+            except ExtractionError as e:
+                logger.error(f"Skipping submission of {userid}: {e}")
+                shutil.rmtree(Path(self.target_path) / userid,
+                              ignore_errors=True)
+                self.parsed.pop(userid, None)
+
+        self.populate_submission_db()
 
         return 0
 
-    def splitAndStore(self, filename: str, current_dir):
-        userid_pattern = r'_([a-zA-Z]{2,5}\d{2,6})_'
-
-        match = re.search(userid_pattern, filename)
-        if match:
-            userid = match.group(1)
-            directory_name = userid
+    def store_member(self, zip_ref: ZipFile, info: ZipInfo, userid: str):
+        filename = Path(info.filename).name
+        directory_path = Path(self.target_path) / userid
+
+        if Path(filename).suffix == '.zip':
+            self.extractor.extract_archive(
+                zip_ref, info, directory_path / "submission")
+        elif Path(filename).suffix == '.txt':
+            log_path = directory_path / 'submission.log'
+            self.extractor.extract_file(zip_ref, info, log_path)
+            self.process_submission_log(log_path, userid, directory_path)
+        elif not is_junk(filename):
+            self.extractor.extract_file(
+                zip_ref, info, directory_path / filename)
         else:
-            print(f"No user ID found in filename '{filename}'. Skipping file.")
             return
 
-        original_file_path = current_dir / filename
-
-        if original_file_path.exists():
-            directory_path = current_dir / directory_name
-
-            if Path(filename).suffix == '.zip':
-                directory_path /= "submission"
-
-            directory_path.mkdir(exist_ok=True, parents=True)
-
-            if Path(filename).suffix == '.txt':
-                filename = 'submission.log'
-
-            new_file_path = directory_path / filename
-            original_file_path.rename(new_file_path)
-
-            if filename == 'submission.log':
-                self.process_submission_log(
-                    new_file_path, userid, new_file_path.parent)
-
-            print(f"File '{filename}' stored in directory '{directory_name}'")
-        else:
-            print(f"File '{filename}' does not exist in the directory.")
+        print(f"File '{filename}' stored in directory '{userid}'")
 
     def process_submission_log(self, log_path: Path, userid: str, submission_dir: Path):
         submission_pattern = r"Date Submitted:\s+(.*)\s+[A-Z]{3,4}$"
@@ -85,48 +84,77 @@ class Organizer:
                     break
 
         if submission_date:
-            self.populate_submission_db(
-                userid, submission_date, submission_dir)
+            # Keep only the latest attempt per student
+            previous = self.parsed.get(userid)
+            if previous is None or previous[0] <= submission_date:
+                self.parsed[userid] = (submission_date, submission_dir)
+
+    def populate_submission_db(self):
+        if not self.parsed:
+            return
 
-    def populate_submission_db(self, userid: str, submission_date: datetime, submission_dir: Path):
         db: Session = SessionLocal()
 
         try:
-            # Fetch the student by their user ID
-            student = db.query(Student).filter(
-                Student.UserID == userid).first()
-
-            if student:
-                assignment = db.query(Assignment).filter(
-                    Assignment.id == self.assignment_id).first()
-                if assignment:
-                    rubrics = assignment.rubric  # Assuming a relationship exists
-                    test_cases = rubrics.get("test_cases")
-                    logger.info(test_cases)
-
-                    cleaned_test_cases = self.clean_test_cases(test_cases)
-
-                    new_submission = Submission(
-                        student_id=student.UserID,
-                        assignment_id=self.assignment_id,
-                        submission_date=submission_date,
-                        feedback={},
-                        test_cases=cleaned_test_cases,
-                        grade=0.0,
-                        file_path=str(submission_dir)
-                    )
-
-                    db.add(new_submission)
-                    db.commit()
-                    db.refresh(new_submission)
-
-                    print(f"Submission for student {
-                          student.Name} added to DB.")
-                else:
-                    print(f"Assignment with ID {
-                          self.assignment_id} not found.")
-            else:
+            assignment = db.query(Assignment).filter(
+                Assignment.id == self.assignment_id).first()
+            if not assignment:
+                print(f"Assignment with ID {self.assignment_id} not found.")
+                return
+
+            cleaned_test_cases = self.clean_test_cases(
+                assignment.rubric.get("test_cases"))
+
+            known_students = {
+                row.UserID for row in db.query(Student.UserID).filter(
+                    Student.UserID.in_(list(self.parsed)))
+            }
+            for userid in self.parsed.keys() - known_students:
                 print(f"Student with UserID {userid} not found.")
+
+            rows = [
+                {
+                    "student_id": userid,
+                    "assignment_id": self.assignment_id,
+                    "submission_date": submission_date,
+                    "feedback": {},
+                    "test_cases": cleaned_test_cases,
+                    "grade": 0.0,
+                    "file_path": str(submission_dir),
+                    "fingerprint": self.fingerprints.get(userid),
+                }
+                for userid, (submission_date, submission_dir) in self.parsed.items()
+                if userid in known_students
+            ]
+            previous = db.query(Submission.id, Submission.file_path).filter(
+                Submission.assignment_id == self.assignment_id,
+                Submission.student_id.in_([row["student_id"] for row in rows])).all()
+
+            # A new attempt starts ungraded, but feedback and grade stay
+            # until the grader changes them
+            bulk_upsert(
+                db,
+                Submission,
+                rows,
+                index_elements=["student_id", "assignment_id"],
+                update_columns=["submission_date", "file_path",
+                                "fingerprint", "test_cases"],
+            )
+            sync_test_results(
+                db, [(row.id, cleaned_test_cases) for row in previous], reset_runs=True)
+            sync_new_submissions(db, self.assignment_id)
+            grades_changed(db, self.assignment_id)
+            db.commit()
+
+            current = {row["file_path"] for row in rows}
+            remove_superseded(
+                row.file_path for row in previous if row.file_path not in current)
+
+            print(f"{len(rows)} submissions for assignment {
+                  self.assignment_id} added to DB.")
+        except Exception:
+            db.rollback()
+            raise
         finally:
             db.close()
 
@@ -139,12 +167,77 @@ class Organizer:
         else:
             return None
 
-    def unzip_recursive(self, dir_path):
-        for item in dir_path.iterdir():
-            if item.is_file() and item.suffix == '.zip':
-                with ZipFile(item, 'r') as zip_ref:
-                    zip_ref.extractall(dir_path)
-                item.unlink()
-        for subdir in dir_path.iterdir():
-            if subdir.is_dir():
-                self.unzip_recursive(subdir)
+
+def extraction_root(assignment_id: int, upload_id: str):
+    """Each upload gets its own directory, so organizing never rescans earlier uploads."""
+    return UNZIP_DIR / f"assignment_{assignment_id}" / upload_id
+
+
+def remove_superseded(file_paths):
+    """Delete the extracted files of attempts that a newer upload replaced."""
+    for file_path in file_paths:
+        submission_dir = Path(file_path)
+        if not submission_dir.is_relative_to(UNZIP_DIR):
+            continue
+        shutil.rmtree(submission_dir, ignore_errors=True)
+        # The upload's root once its last attempt is gone
+        upload_root = submission_dir.parent
+        try:
+            if upload_root != UNZIP_DIR and not any(upload_root.iterdir()):
+                upload_root.rmdir()
+        except OSError:
+            pass
+
+
+def group_members(zip_ref: ZipFile):
+    members = {}
+    for info in zip_ref.infolist():
+        match = re.search(USERID_PATTERN, Path(info.filename).name)
+        if match and not info.is_dir() and not is_junk(info.filename):
+            members.setdefault(match.group(1), []).append(info)
+    return members
+
+
+def fingerprint(zip_ref: ZipFile, infos):
+    """Blackboard attempt file contents plus the CRC of every other member, without extracting."""
+    digest = hashlib.sha256()
+    for info in sorted(infos, key=lambda info: info.filename):
+        digest.update(info.filename.encode())
+        if info.filename.endswith('.txt'):
+            digest.update(zip_ref.read(info))
+        else:
+            digest.update(f"{info.CRC:08x}:{info.file_size}".encode())
+    return digest.hexdigest()
+
+
+def stored_fingerprints(assignment_id: int):
+    with SessionLocal() as db:
+        return dict(db.query(Submission.student_id, Submission.fingerprint).filter(
+            Submission.assignment_id == assignment_id))
+
+
+def ingest_gradebook(gradebook_path: Path, assignment_id: int):
+    """Extract the new or changed attempts of an uploaded gradebook and register them."""
+    target_path = extraction_root(assignment_id, Path(gradebook_path).stem)
+    target_path.mkdir(parents=True, exist_ok=True)
+
+    known = stored_fingerprints(assignment_id)
+    fingerprints = {}
+
+    with ZipFile(gradebook_path, 'r') as zip_ref:
+        members = group_members(zip_ref)
+        for userid, infos in members.items():
+            current = fingerprint(zip_ref, infos)
+            if known.get(userid) != current:
+                fingerprints[userid] = current
+
+        logger.info(f"Gradebook {gradebook_path.name}: {len(fingerprints)} of {
+                    len(members)} attempts are new or changed")
+
+        if fingerprints:
+            changed = {userid: members[userid] for userid in fingerprints}
+            Organizer(target_path, assignment_id,
+                      fingerprints).organize(zip_ref, changed)
+
+    if not any(target_path.iterdir()):
+        target_path.rmdir()
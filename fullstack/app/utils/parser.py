@@ -1,6 +1,9 @@
 import logging
 from app.models import Group, Student
+from app.database import bulk_upsert
+from app.utils.analytics import grades_changed
 from fastapi import HTTPException
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -8,57 +11,75 @@ logger = logging.getLogger('uvicorn.error')
 
 
 def parse_group_file(fileContent):
-    class_data = []
+    class_data = {}
+    group_number = None
 
-    for line in fileContent.split('\n'):
+    for line in fileContent.splitlines():
         line = line.strip()
-        logger.error(line)
+        logger.debug(line)
         if line.startswith("Group"):
             group_number = int(line.split()[-1])  # Extract group number
         elif line:
             parts = line.split()
             if len(parts) >= 3:
-                student_data = {
+                # Last listing wins if a student appears twice
+                class_data[parts[-1]] = {
                     "DrexelID": parts[0],
                     "Name": " ".join(parts[1:-1]),
                     "UserID": parts[-1],
                     "GroupID": group_number
                 }
-                class_data.append(student_data)
 
-    return class_data
+    return list(class_data.values())
 
 
-def insert_group_data(db: Session, class_data):
-    group_objects = {}
+def get_or_create_groups(db: Session, group_numbers):
+    group_ids = {}
+    for group in db.query(Group.id, Group.group_number).filter(
+            Group.group_number.in_(group_numbers)).order_by(Group.id):
+        group_ids.setdefault(group.group_number, group.id)
 
-    try:
-        # Iterate over class data to insert groups and students
-        for student_data in class_data:
-            group_number = student_data["GroupID"]
+    missing = [{"group_number": number}
+               for number in sorted(group_numbers - group_ids.keys())]
+    if missing:
+        created = db.execute(
+            insert(Group).values(missing).returning(
+                Group.id, Group.group_number)
+        )
+        for group in created:
+            group_ids[group.group_number] = group.id
+            logger.info(f"Group {group.group_number} created with ID {
+                        group.id}")
 
-            # Check if the group already exists in the current session
-            if group_number not in group_objects:
-                new_group = Group(group_number=group_number)
-                db.add(new_group)
-                db.commit()  # Commit the group to get its ID
-                db.refresh(new_group)  # Refresh the group to get the new ID
-                group_objects[group_number] = new_group
+    return group_ids
 
-                logger.info(f"Group {group_number} created with ID {
-                            new_group.id}")
 
-            student = Student(
-                UserID=student_data["UserID"],
-                Name=student_data["Name"],
-                DrexelID=student_data["DrexelID"],
-                group_id=group_objects[group_number].id
-            )
+def insert_group_data(db: Session, class_data):
+    try:
+        group_ids = get_or_create_groups(
+            db, {s["GroupID"] for s in class_data if s["GroupID"] is not None})
 
-            db.add(student)
+        # Re-imports update names, IDs and group moves in place
+        bulk_upsert(
+            db,
+            Student,
+            [
+                {
+                    "UserID": student_data["UserID"],
+                    "Name": student_data["Name"],
+                    "DrexelID": student_data["DrexelID"],
+                    "group_id": group_ids.get(student_data["GroupID"]),
+                }
+                for student_data in class_data
+            ],
+            index_elements=["UserID"],
+            update_columns=["Name", "DrexelID", "group_id"],
+        )
+        # Group moves change every assignment's per-group numbers
+        grades_changed(db)
 
         db.commit()
-        logger.info("All students successfully added to the database.")
+        logger.info(f"{len(class_data)} students successfully added to the database.")
 
     except IntegrityError as e:
         db.rollback()
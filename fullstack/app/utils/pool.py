@@ -0,0 +1,108 @@
+import time
+import threading
+from collections import deque
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import logging
+from app import DB_POOL_SLOW_CHECKOUT
+
+logger = logging.getLogger('uvicorn.error')
+
+
+class PoolStats:
+    """How long checkouts waited for a connection, over the process lifetime and the last ``window`` checkouts."""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait, timed_out=False, failed=False):
+        with self.lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.errors += failed
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.recent.append(wait)
+
+    def snapshot(self):
+        with self.lock:
+            recent = sorted(self.recent)
+            checkouts, timeouts, errors = self.checkouts, self.timeouts, self.errors
+            total_wait, max_wait = self.total_wait, self.max_wait
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(len(recent) * p))] if recent else 0.0
+
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "errors": errors,
+            "mean_wait": total_wait / checkouts if checkouts else 0.0,
+            "max_wait": max_wait,
+            "p50_wait": percentile(0.50),
+            "p95_wait": percentile(0.95),
+            "p99_wait": percentile(0.99),
+        }
+
+
+class TimedPool:
+    """Times every checkout; mixed in ahead of a QueuePool class.
+
+    Stats live on the class, so they survive ``engine.dispose()``
+    recreating the pool.
+    """
+
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        except Exception as e:
+            # e.g. the database refusing a new overflow connection
+            self.stats.record(time.perf_counter() - start, failed=True)
+            logger.error(f"Could not check out a database connection: {e}")
+            raise
+
+        wait = time.perf_counter() - start
+        self.stats.record(wait)
+        if wait >= DB_POOL_SLOW_CHECKOUT:
+            logger.warning(
+                f"Waited {wait:.2f}s for a database connection ({self.status()})")
+        return connection
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    stats = PoolStats()
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        status.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "saturation": pool.checkedout() / capacity if capacity else None,
+        })
+    if isinstance(pool, TimedPool):
+        status.update(pool.stats.snapshot())
+    return status
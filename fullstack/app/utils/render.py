@@ -0,0 +1,129 @@
+import time
+import gzip
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from fastapi.templating import Jinja2Templates
+from app import TEMPLATES
+from app.utils.cache import hash_key, atomic_write
+from app.utils.testrunner import TestRunner
+
+logger = logging.getLogger('uvicorn.error')
+templates = Jinja2Templates(directory=TEMPLATES)
+
+# Heavy per-tab fields, served one tab at a time instead of in the page
+TAB_BODY = ('content', 'error')
+# Unfinished render directories older than this were left by a crash
+ABANDONED_AFTER = 24 * 60 * 60
+
+
+def results_dir(file_path):
+    return Path(file_path) / 'results'
+
+
+def render_key(submission, assignment):
+    """Changes whenever the submission's files or the rubric it is graded against do."""
+    return hash_key(submission.file_path, submission.fingerprint, assignment.rubric)
+
+
+def is_fresh(manifest, submission, assignment):
+    return manifest is not None and manifest["source"] == render_key(submission, assignment)
+
+
+def artifact_path(directory: Path, manifest: dict, name: str):
+    return directory / manifest["render"] / f"{name}.gz"
+
+
+def write_artifact(directory: Path, name: str, data: bytes):
+    """Store ``data`` gzipped as ``name``.gz and return its manifest entry."""
+    (directory / f"{name}.gz").write_bytes(gzip.compress(data, mtime=0))
+    return {"etag": hashlib.sha256(data).hexdigest()[:32], "size": len(data)}
+
+
+def read_manifest(directory: Path):
+    try:
+        return json.loads((directory / 'manifest.json').read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_results(directory: Path, tabs):
+    """Store each tab's body as <n>.json and the rest of every tab in index.json."""
+    artifacts = {}
+    index = []
+    for number, tab in enumerate(tabs):
+        body = {key: tab.get(key) for key in TAB_BODY}
+        artifacts[f"{number}.json"] = write_artifact(
+            directory, f"{number}.json", json.dumps(body).encode())
+        index.append({
+            **{key: value for key, value in tab.items() if key not in TAB_BODY},
+            'index': number,
+        })
+
+    artifacts['index.json'] = write_artifact(
+        directory, 'index.json', json.dumps(index).encode())
+    return index, artifacts
+
+
+def process_submission(file_path, submission, student, assignment, user):
+    """Run the tests and publish the results as a new render, replacing the previous one atomically.
+
+    Returns the index of the render's tabs.
+
+    Each render is written to its own hidden directory and only becomes
+    visible once the manifest pointing at it replaces the old one, so a
+    reader never sees a mix of two renders.
+    """
+    logger.info(f"Processing submission for student: {student.Name}")
+    test_cases = assignment.rubric.get('test_cases', {})
+    files = assignment.rubric.get('files', [])
+    source = render_key(submission, assignment)
+
+    runner = TestRunner(submission_folder=file_path, files=files,
+                        fingerprint=submission.fingerprint)
+    tabs = runner.generate_tabs(test_cases=test_cases)
+
+    directory = results_dir(file_path)
+    render_id = uuid.uuid4().hex
+    staging = directory / f".{render_id}"
+    staging.mkdir(parents=True)
+    try:
+        tabs, artifacts = write_results(staging, tabs)
+
+        context = {
+            "assignment_number": submission.assignment_id,
+            "user_id": student.UserID,
+            "submission": submission,
+            "tabs": tabs,
+            "username": user,
+            "title": f"Assignment {submission.assignment_id} Submission for {student.Name}",
+        }
+
+        html_content = templates.get_template("test_result.html").render(context)
+        artifacts['result.html'] = write_artifact(
+            staging, 'result.html', html_content.encode('utf-8'))
+        staging.rename(directory / render_id)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    manifest = {"source": source, "render": render_id, "artifacts": artifacts}
+    atomic_write(directory / 'manifest.json', json.dumps(manifest).encode())
+    remove_old_renders(directory, render_id)
+    return tabs
+
+
+def remove_old_renders(directory: Path, current: str):
+    # Another render of this submission may have published after us
+    manifest = read_manifest(directory)
+    keep = {current, manifest["render"] if manifest else None}
+    for path in directory.iterdir():
+        if not path.is_dir() or path.name in keep:
+            continue
+        # Hidden directories belong to renders still being written
+        if path.name.startswith('.') and time.time() - path.stat().st_mtime < ABANDONED_AFTER:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,96 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import bulk_upsert
+from app.models import Submission, TestResult
+
+SCORES = {"correct": 1.0, "incorrect": 0.0}
+
+
+def flatten(test_cases, path=()):
+    """Yield (test case name, leaf) for every leaf of a test_cases tree."""
+    for key, value in (test_cases or {}).items():
+        if isinstance(value, dict):
+            yield from flatten(value, path + (key,))
+        else:
+            yield " ".join(path + (key,)), value
+
+
+def in_rubric_order(test_cases, rubric_cases):
+    """``test_cases`` with the keys at every level in the order the rubric lists them.
+
+    Postgres stores test_cases as JSONB, which hands keys back sorted.
+    """
+    if not isinstance(test_cases, dict):
+        return test_cases
+    if not isinstance(rubric_cases, dict):
+        rubric_cases = {}
+
+    keys = [key for key in rubric_cases if key in test_cases]
+    keys += [key for key in test_cases if key not in rubric_cases]
+    return {key: in_rubric_order(test_cases[key], rubric_cases.get(key)) for key in keys}
+
+
+def verdict(value):
+    """The grading state the test result page stores for a test: true, false or null."""
+    if value is True:
+        return "correct"
+    if value is False:
+        return "incorrect"
+    return "ungraded"
+
+
+def sync_test_results(db: Session, submissions, reset_runs=False):
+    """Make the test_results rows of each (id, test_cases) pair match its JSON.
+
+    Run outcomes already recorded for a test case are kept, unless
+    ``reset_runs`` because they belong to an earlier attempt.
+    """
+    runs = {"run_status": None, "duration": None, "output_hash": None} if reset_runs else {}
+    rows = []
+    for submission_id, test_cases in submissions:
+        names = []
+        for name, value in flatten(test_cases):
+            status = verdict(value)
+            names.append(name)
+            rows.append({
+                "submission_id": submission_id,
+                "test_case": name,
+                "status": status,
+                "score": SCORES.get(status),
+                **runs,
+            })
+        db.query(TestResult).filter(
+            TestResult.submission_id == submission_id,
+            TestResult.test_case.notin_(names)
+        ).delete(synchronize_session=False)
+
+    bulk_upsert(db, TestResult, rows,
+                index_elements=["submission_id", "test_case"],
+                update_columns=["status", "score", *runs])
+
+
+def sync_new_submissions(db: Session, assignment_id: int):
+    """Create test_results rows for the assignment's submissions that have none yet."""
+    has_results = select(TestResult.id).where(
+        TestResult.submission_id == Submission.id).exists()
+    submissions = db.query(Submission.id, Submission.test_cases).filter(
+        Submission.assignment_id == assignment_id, ~has_results)
+    sync_test_results(db, submissions.all())
+
+
+def record_runs(db: Session, submission_id: int, tabs):
+    """Store how each output tab's test run ended on its test_results row."""
+    rows = [
+        {
+            "submission_id": submission_id,
+            "test_case": tab["title"],
+            "status": "ungraded",
+            "run_status": tab["status"],
+            "duration": tab["duration"],
+            "output_hash": tab["output_hash"],
+        }
+        for tab in tabs if tab.get("type") == "output"
+    ]
+    bulk_upsert(db, TestResult, rows,
+                index_elements=["submission_id", "test_case"],
+                update_columns=["run_status", "duration", "output_hash"])
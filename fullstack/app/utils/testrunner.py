@@ -1,18 +1,114 @@
+import signal
+import hashlib
 import subprocess
+import functools
+from typing import NamedTuple
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from ansi2html import Ansi2HTMLConverter
-import pygments
-from pygments import formatters, lexers
 from pygments.util import ClassNotFound
 import logging
+from app import (
+    PYTHON,
+    CACHE_DIR,
+    TEST_WORKERS,
+    TEST_BACKEND,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_MAX_BYTES,
+    TEST_SANDBOX,
+    TEST_TIMEOUT,
+    TEST_CPU_LIMIT,
+    TEST_MEMORY_LIMIT,
+    TEST_NPROC_LIMIT,
+    TEST_FSIZE_LIMIT,
+    OUTPUT_MAX_BYTES,
+)
+from app.utils.cache import DiskCache, hash_key
+from app.utils.extractor import is_junk
+from app.utils.forkserver import get_pool, run_batch, run_limited
+from app.utils.highlight import highlight
 
 logger = logging.getLogger('uvicorn.error')
 
+result_cache = DiskCache(CACHE_DIR / "results", RESULT_CACHE_MAX_BYTES)
+
+
+class RunResult(NamedTuple):
+    stdout: str
+    stderr: str
+    # None when the runner failed before the script could finish
+    returncode: int = 0
+    # ok, error, timeout, cpu_limit, memory_limit, output_limit or killed
+    status: str = "ok"
+    detail: str = None
+    # Wall-clock seconds the script ran for
+    duration: float = None
+
+
+# Outcomes decided by the submission itself. A timeout depends on load and
+# a kill or a runner failure comes from outside, so those are retried.
+CACHEABLE = ("ok", "error", "cpu_limit", "memory_limit", "output_limit")
+
+
+def cacheable(result):
+    return result.returncode is not None and result.status in CACHEABLE
+
+
+def sandbox_limits():
+    if not TEST_SANDBOX:
+        return None
+    return {
+        "timeout": TEST_TIMEOUT,
+        "cpu": TEST_CPU_LIMIT,
+        "memory": TEST_MEMORY_LIMIT,
+        "nproc": TEST_NPROC_LIMIT,
+        "fsize": TEST_FSIZE_LIMIT,
+    }
+
+
+def classify(stdout, stderr, returncode, stopped=None, duration=None, cpu_time=None, limits=None):
+    """Turn a finished run into a RunResult saying which limit, if any, stopped it."""
+    limits = limits or {}
+    status, detail = "ok", None
+    if stopped == "timeout":
+        status, detail = "timeout", f"timed out after {limits.get('timeout'):g} s"
+    elif stopped == "output":
+        status, detail = "output_limit", f"printed more than {OUTPUT_MAX_BYTES} bytes"
+    # Past the soft CPU limit comes SIGXCPU, past the hard one SIGKILL; any
+    # other SIGKILL (the OOM killer, the script itself) is just a kill
+    elif returncode == -signal.SIGXCPU or (
+            returncode == -signal.SIGKILL and limits.get("cpu")
+            and cpu_time is not None and cpu_time >= limits["cpu"]):
+        status, detail = "cpu_limit", f"exceeded the {limits.get('cpu')} s CPU limit"
+    # Python ignores SIGXFSZ, so hitting RLIMIT_FSIZE surfaces as EFBIG
+    elif returncode == -signal.SIGXFSZ or (
+            returncode != 0 and "[Errno 27] File too large" in stderr[-2000:]):
+        status, detail = "output_limit", f"wrote more than {limits.get('fsize')} bytes to a file"
+    elif returncode != 0 and "MemoryError" in stderr[-2000:]:
+        status, detail = "memory_limit", f"ran out of memory (limit {limits.get('memory')} bytes)"
+    elif returncode < 0:
+        status, detail = "killed", f"killed by {signal.Signals(-returncode).name}"
+    elif returncode != 0:
+        status, detail = "error", f"exited with status {returncode}"
+    return RunResult(stdout, stderr, returncode, status, detail, duration)
+
+
+@functools.lru_cache(maxsize=None)
+def interpreter_version():
+    result = subprocess.run(
+        [PYTHON, '-c', 'import sys; print(sys.version)'], capture_output=True, text=True)
+    return result.stdout.strip()
+
 
 class TestRunner:
-    def __init__(self, submission_folder, files):
+    def __init__(self, submission_folder, files, max_workers=TEST_WORKERS, backend=TEST_BACKEND, use_cache=RESULT_CACHE_ENABLED, limits=None, fingerprint=None):
         self.submission_folder = Path(submission_folder, "submission")
         self.files = files
+        self.fingerprint = fingerprint
+        self.max_workers = max_workers
+        self.backend = backend
+        self.use_cache = use_cache
+        self.limits = sandbox_limits() if limits is None else limits
         self.conv = Ansi2HTMLConverter(inline=True)
         self.tabs = []
         self.file_map = self.recursively_find_files(self.submission_folder)
@@ -26,87 +122,183 @@ class TestRunner:
             if path.is_file() and not path.name.startswith('.')
         }
 
+    @functools.cached_property
+    def content_hash(self):
+        """Identifies the submission's files as uploaded.
+
+        Scripts run next to their files and may write there, and Python
+        leaves __pycache__ behind, so the fingerprint taken at ingest is
+        used when there is one. Otherwise the files are hashed, leaving
+        out what extraction would have skipped.
+        """
+        if self.fingerprint:
+            return self.fingerprint
+
+        digest = hashlib.sha256()
+        for path in sorted(self.submission_folder.rglob('*')):
+            relative = path.relative_to(self.submission_folder)
+            if not path.is_file() or is_junk(relative.as_posix()) or any(
+                    part.startswith('.') for part in relative.parts):
+                continue
+            digest.update(str(relative).encode())
+            digest.update(b"\0")
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        return digest.hexdigest()
+
+    def cache_key(self, case):
+        script_name, args, _ = case
+        return hash_key(self.content_hash, script_name, args, interpreter_version(), self.limits)
+
     def run_script(self, script_name, *args):
         script_path = self.file_map.get(script_name)
         if not script_path:
             logger.error(
                 f"Script {script_name} not found in submission folder.")
-            return '', f"Error: {script_name} not found."
+            return RunResult('', f"Error: {script_name} not found.", None, "error", "script not found")
 
-        command = ['python3', script_path] + list(args)
+        script_path = script_path.resolve()
         logger.info(f"Executing command: {script_path}")
-        result = subprocess.run(command, capture_output=True, text=True)
-        return result.stdout, result.stderr
+        if self.backend == "forkserver":
+            result = get_pool().run(script_path, args, self.limits)
+        else:
+            timeout = (self.limits or {}).get("timeout") or None
+            result = run_limited(script_path, args, self.limits, timeout)
 
-    def truncate_output(self, output, num_lines=100):
-        lines = output.splitlines()
-        if len(lines) > num_lines:
-            return '\n'.join(lines[-num_lines:])
-        return output
+        return classify(*result, limits=self.limits)
 
     def get_formatted_code(self, filepath):
         try:
-            with open(filepath, 'r') as file:
-                code = file.read()
-            lexer = lexers.get_lexer_by_name("python")
-            formatter = formatters.HtmlFormatter(
-                style='monokai',
-                noclasses=True,
-                cssstyles='font-size: 16px; line-height: 1.5em;'
-            )
-            return pygments.highlight(code, lexer, formatter)
+            return highlight(Path(filepath).read_bytes())
         except (FileNotFoundError, ClassNotFound):
             return f"<p>File {filepath} not found or could not be processed.</p>"
 
-    def generate_tabs(self, test_cases):
-        def process_test_cases(command_args, test_cases, expected_output=None):
+    def collect_cases(self, test_cases):
+        """Flatten the rubric's test_cases tree into ordered (script, args, expected) cases."""
+        cases = []
+
+        def process_test_cases(command_args, test_cases):
             if isinstance(test_cases, dict):
                 for key, value in test_cases.items():
                     if isinstance(value, (list, dict)):
-                        new_command_args = command_args + [key]
-                        process_test_cases(new_command_args, value)
+                        process_test_cases(command_args + [key], value)
                     elif isinstance(value, str):
                         new_command_args = command_args + [key]
-                        expected = value
-                        script_name = new_command_args[0]
-                        args = new_command_args[1:]
-
-                        # Extract file_name, function_name, and test_case
-                        file_name = script_name
-                        function_name = args[0] if len(args) > 0 else ''
-                        test_case = args[1] if len(args) > 1 else ''
-
-                        logger.info(f"Running script: {
-                                    script_name} with args: {args}")
-                        stdout, stderr = self.run_script(script_name, *args)
-                        stdout_truncated = self.truncate_output(stdout)
-                        stderr_truncated = self.truncate_output(stderr)
-
-                        # Construct a valid HTML ID
-                        tab_id = f"tab_{script_name}_{'_'.join(args)}".replace(
-                            '/', '_').replace(' ', '_')
-
-                        tab = {
-                            'id': tab_id,
-                            'title': f"{script_name} {' '.join(args)}",
-                            'content': self.conv.convert(stdout_truncated, full=False),
-                            'error': stderr_truncated if stderr else None,
-                            'expected': expected,
-                            'command': ' '.join(['python3', script_name] + args),
-                            'type': 'output',
-                            'file_name': file_name,
-                            'function_name': function_name,
-                            'test_case': test_case
-                        }
-                        self.tabs.append(tab)
+                        cases.append(
+                            (new_command_args[0], new_command_args[1:], value))
             else:
                 logger.warning(f"Unexpected test case format: {test_cases}")
 
-        self.tabs = []
         for file, arguments in test_cases.items():
             logger.info(f"Processing test cases for file: {file}")
             process_test_cases([file], arguments)
 
+        return cases
+
+    def run_case(self, case):
+        script_name, args, _ = case
+        logger.info(f"Running script: {script_name} with args: {args}")
+        try:
+            return self.run_script(script_name, *args)
+        except Exception as e:
+            logger.error(f"Error running {script_name} {args}: {e}")
+            return RunResult('', f"Error: could not run {script_name}: {e}", None, "error", str(e))
+
+    def run_file_cases(self, script_name, cases):
+        """Drive every case of one script through a single harness process."""
+        script_path = self.file_map.get(script_name)
+        if not script_path:
+            logger.error(
+                f"Script {script_name} not found in submission folder.")
+            return [RunResult('', f"Error: {script_name} not found.", None, "error", "script not found")] * len(cases)
+
+        logger.info(f"Running {len(cases)} cases of {script_name} in harness")
+        try:
+            results = run_batch(
+                script_path.resolve(), [args for _, args, _ in cases], self.max_workers, self.limits)
+        except Exception as e:
+            logger.error(f"Harness error for {script_name}: {e}")
+            return [self.run_case(case) for case in cases]
+
+        return [classify(*result, limits=self.limits) for result in results]
+
+    def run_batched(self, cases):
+        by_file = {}
+        for index, case in enumerate(cases):
+            by_file.setdefault(case[0], []).append(index)
+
+        results = [None] * len(cases)
+        for script_name, indices in by_file.items():
+            file_results = self.run_file_cases(
+                script_name, [cases[i] for i in indices])
+            for index, result in zip(indices, file_results):
+                results[index] = result
+
+        return results
+
+    def run_cases(self, cases):
+        if not self.use_cache:
+            return self.execute_cases(cases)
+
+        keys = [self.cache_key(case) for case in cases]
+        results = [result_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        logger.info(f"{len(cases) - len(missing)} of {len(cases)} cases cached")
+
+        fresh = self.execute_cases([cases[i] for i in missing])
+        for index, result in zip(missing, fresh):
+            results[index] = result
+            if cacheable(result):
+                result_cache.set(keys[index], list(result))
+
+        return [RunResult(*result) for result in results]
+
+    def execute_cases(self, cases):
+        if self.backend == "harness":
+            return self.run_batched(cases)
+
+        if self.max_workers <= 1 or len(cases) <= 1:
+            return [self.run_case(case) for case in cases]
+
+        workers = min(self.max_workers, len(cases))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.run_case, cases))
+
+    def build_output_tab(self, case, result):
+        script_name, args, expected = case
+        stderr = result.stderr
+        if result.status not in ("ok", "error"):
+            stderr = f"[{result.detail}]\n{stderr}"
+
+        # Construct a valid HTML ID
+        tab_id = f"tab_{script_name}_{'_'.join(args)}".replace(
+            '/', '_').replace(' ', '_')
+
+        return {
+            'id': tab_id,
+            'title': f"{script_name} {' '.join(args)}",
+            'content': self.conv.convert(result.stdout, full=False),
+            'error': stderr or None,
+            'status': result.status,
+            'detail': result.detail,
+            'duration': result.duration,
+            'output_hash': hashlib.sha256(result.stdout.encode()).hexdigest()[:32],
+            'expected': expected,
+            'command': ' '.join(['python3', script_name] + args),
+            'type': 'output',
+            'file_name': script_name,
+            'function_name': args[0] if len(args) > 0 else '',
+            'test_case': args[1] if len(args) > 1 else ''
+        }
+
+    def generate_tabs(self, test_cases):
+        cases = self.collect_cases(test_cases)
+        results = self.run_cases(cases)
+
+        self.tabs = [
+            self.build_output_tab(case, result)
+            for case, result in zip(cases, results)
+        ]
+
         for file in self.files:
             file_path = self.file_map.get(file)
             if file_path:
@@ -0,0 +1,282 @@
+"""Pre-warmed interpreter that forks a child per student script.
+
+Runs as a standalone ``python3 zygote.py [module ...]`` process, so it must
+not import anything from ``app``. Each request is a JSON line on stdin:
+
+    {"script": "...", "args": [...], "stdout": "...", "stderr": "...", "limits": {...}}
+
+and each reply is a JSON line on stdout:
+``{"returncode": int, "timed_out": bool, "duration": seconds, "cpu_time": seconds}``.
+Every child runs in its own session under the request's ``limits``
+(timeout, cpu, memory, nproc, fsize; see ``apply_limits``), and its whole
+process group is killed once it exits or runs out of time.
+
+``python3 zygote.py --batch JOBS [module ...]`` is the harness mode: it reads
+every request up front, compiles each student script once, and runs the
+cases as up to JOBS concurrent children, replying in request order.
+
+``python3 zygote.py --exec LIMITS script [arg ...]`` applies the JSON
+``LIMITS`` and then execs a fresh ``python3 script args``.
+"""
+import ast
+import contextlib
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import time
+import types
+import signal
+import resource
+import traceback
+
+LIMITS = {
+    "cpu": resource.RLIMIT_CPU,
+    "memory": resource.RLIMIT_AS,
+    "nproc": resource.RLIMIT_NPROC,
+    "fsize": resource.RLIMIT_FSIZE,
+}
+
+
+def preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def exit_code(exc):
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def load(script):
+    """Compile ``script`` and warm the third-party/stdlib modules it imports."""
+    script = os.path.abspath(script)
+    try:
+        with open(script, "rb") as source:
+            source = source.read()
+        tree = ast.parse(source, script)
+        code = compile(tree, script, "exec")
+    except (OSError, SyntaxError, ValueError):
+        # Let each case report the error exactly like python3 would
+        return None
+
+    local = os.path.dirname(script)
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            names = [node.module]
+        else:
+            continue
+
+        for name in names:
+            try:
+                spec = importlib.util.find_spec(name.split(".")[0])
+            except (ImportError, ValueError):
+                continue
+            # Never import the student's own modules in the parent
+            if spec and spec.origin and not spec.origin.startswith(local):
+                preload([name])
+
+    return code
+
+
+def run_script(script, args, code=None):
+    """Execute ``script`` as ``__main__`` the way ``python3 script args`` would."""
+    script = os.path.abspath(script)
+    sys.argv = [script] + list(args)
+    sys.path.insert(0, os.path.dirname(script))
+
+    main = types.ModuleType("__main__")
+    main.__file__ = script
+    main.__builtins__ = __builtins__
+    sys.modules["__main__"] = main
+
+    try:
+        if code is None:
+            with open(script, "rb") as source:
+                code = compile(source.read(), script, "exec")
+        exec(code, main.__dict__)
+    except SystemExit as e:
+        return exit_code(e)
+    except BaseException as e:
+        # Drop this frame so the traceback starts at the student's script
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    return 0
+
+
+def apply_limits(limits):
+    # New session, so the whole process tree can be killed as one group
+    os.setsid()
+    for name, rlimit in LIMITS.items():
+        value = (limits or {}).get(name)
+        if not value:
+            continue
+        # A soft CPU limit below the hard one delivers SIGXCPU first
+        hard = value + 1 if name == "cpu" else value
+        try:
+            resource.setrlimit(rlimit, (value, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def exited(pid):
+    """True once ``pid`` has exited, without reaping it."""
+    return os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+
+
+def reap(pid, timed_out):
+    # Kill leftovers while the exited child still anchors the group
+    kill_group(pid)
+    _, status, usage = os.wait4(pid, 0)
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+    }
+
+
+def supervise(running, deadlines):
+    """Wait until one of ``running`` (pid -> key) exits or passes its deadline."""
+    delay = 0.0005
+    while True:
+        now = time.monotonic()
+        for pid in list(running):
+            if exited(pid):
+                return running.pop(pid), reap(pid, False)
+            if deadlines.get(pid) and now >= deadlines[pid]:
+                kill_group(pid)
+                return running.pop(pid), reap(pid, True)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+
+def spawn(request, code=None):
+    pid = os.fork()
+    if pid == 0:
+        child(request, code)
+
+    timeout = (request.get("limits") or {}).get("timeout")
+    return pid, time.monotonic() + timeout if timeout else None
+
+
+def child(request, code=None):
+    apply_limits(request.get("limits"))
+    os.chdir(os.path.dirname(os.path.abspath(request["script"])))
+
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    for fd, path in ((1, request["stdout"]), (2, request["stderr"])):
+        out = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(out, fd)
+        os.close(out)
+
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+
+    if "random" in sys.modules:
+        sys.modules["random"].seed()
+
+    returncode = run_script(
+        request["script"], request.get("args", []), code)
+
+    try:
+        import atexit
+        atexit._run_exitfuncs()
+    finally:
+        # A full stdout must not swallow the traceback waiting in stderr;
+        # python3 itself exits with 120 when the final flush fails
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                returncode = returncode or 120
+        os._exit(returncode)
+
+
+def serve(requests, replies):
+    for line in requests:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+
+        started = time.monotonic()
+        pid, deadline = spawn(request)
+        _, reply = supervise({pid: None}, {pid: deadline})
+        reply["duration"] = time.monotonic() - started
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+def serve_batch(requests, replies, jobs):
+    requests = [json.loads(line) for line in requests if line.strip()]
+    compiled = {}
+    # stdout is the reply channel, keep import-time prints off it
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for request in requests:
+            if request["script"] not in compiled:
+                compiled[request["script"]] = load(request["script"])
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    results = [None] * len(requests)
+    started = [None] * len(requests)
+    running = {}
+    deadlines = {}
+    pending = iter(enumerate(requests))
+
+    while True:
+        while len(running) < jobs:
+            index, request = next(pending, (None, None))
+            if request is None:
+                break
+            started[index] = time.monotonic()
+            pid, deadlines[pid] = spawn(request, compiled[request["script"]])
+            running[pid] = index
+
+        if not running:
+            break
+
+        index, results[index] = supervise(running, deadlines)
+        results[index]["duration"] = time.monotonic() - started[index]
+
+    for result in results:
+        replies.write(json.dumps(result) + "\n")
+    replies.flush()
+
+
+def exec_limited(limits, script, args):
+    apply_limits(limits)
+    os.execv(sys.executable, [sys.executable, script] + args)
+
+
+if __name__ == "__main__":
+    # Don't let app/utils shadow the student's imports
+    del sys.path[0]
+    if sys.argv[1:2] == ["--exec"]:
+        exec_limited(json.loads(sys.argv[2]), sys.argv[3], sys.argv[4:])
+    elif sys.argv[1:2] == ["--batch"]:
+        preload(sys.argv[3:])
+        serve_batch(sys.stdin, sys.stdout, max(1, int(sys.argv[2])))
+    else:
+        preload(sys.argv[1:])
+        serve(sys.stdin, sys.stdout)
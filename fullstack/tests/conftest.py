@@ -0,0 +1,43 @@
+import os
+import tempfile
+from pathlib import Path
+
+# The engines are built when app.database is imported, so this has to be
+# set before any test module imports the app
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp()) / 'grader.db'}")
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from app.database import Base, SessionLocal, engine, async_engine, migrate  # noqa: E402
+from app.utils.assignments import assignment_cache  # noqa: E402
+
+
+# Enforce foreign keys like Postgres does
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'grader.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    """A session on the app's SQLite database, emptied again after the test."""
+    migrate(engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    assignment_cache.clear()
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Assignment, Group, Student, Submission, TestResult as Result
+from app.utils.analytics import grades_changed, stats_cache
+
+
+@pytest.fixture
+def client(db):
+    stats_cache.clear()
+    client = TestClient(app)
+    client.post("/login", data={"username": "ta"}, follow_redirects=False)
+    yield client
+    stats_cache.clear()
+
+
+def seed(db):
+    db.add(Group(id=1, group_number=1))
+    db.add(Assignment(id=1, name="hw1", rubric={}, due_date=datetime(2024, 10, 8)))
+    for userid, group_id, grade, status, run_status in [
+        ("s0", 1, 80.0, "correct", "ok"),
+        ("s1", 1, 100.0, "incorrect", "timeout"),
+        ("s2", None, None, "ungraded", None),
+    ]:
+        db.add(Student(UserID=userid, Name=userid, DrexelID=userid, group_id=group_id))
+        submission = Submission(student_id=userid, assignment_id=1, feedback={},
+                                test_cases={}, file_path=userid, grade=grade)
+        db.add(submission)
+        db.flush()
+        db.add(Result(submission_id=submission.id, test_case="p1.py f 1",
+                      status=status, run_status=run_status))
+    db.commit()
+
+
+def test_assignment_stats(client, db):
+    seed(db)
+    stats = client.get("/grade/assignment/1/analytics/data").json()
+
+    assert (stats["submissions"], stats["graded"]) == (3, 2)
+    assert stats["grades"]["mean"] == 90.0
+    assert stats["groups"] == [
+        {"group": 1, "submissions": 2, "graded": 2, "mean": 90.0},
+        {"group": "Ungrouped", "submissions": 1, "graded": 0, "mean": None},
+    ]
+    assert stats["tests"] == [{
+        "test_case": "p1.py f 1", "total": 3, "correct": 1, "incorrect": 1,
+        "pass_rate": 0.5, "run_ok_rate": 0.5,
+    }]
+
+
+def test_grades_changed_invalidates_cached_stats(client, db):
+    seed(db)
+    assert client.get("/grade/assignment/1/analytics/data").json()["grades"]["mean"] == 90.0
+
+    db.query(Submission).filter(Submission.student_id == "s0").update({Submission.grade: 60.0})
+    db.commit()
+    # Cached until the version moves
+    assert client.get("/grade/assignment/1/analytics/data").json()["grades"]["mean"] == 90.0
+
+    grades_changed(db, 1)
+    db.commit()
+    assert client.get("/grade/assignment/1/analytics/data").json()["grades"]["mean"] == 80.0
+
+
+def test_unknown_assignment_is_not_found(client):
+    assert client.get("/grade/assignment/404/analytics/data").status_code == 404
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Assignment, Job, JobTask, Student, Submission, TestResult as Result
+from app.utils import jobs
+from app.utils.assignments import get_assignment
+
+
+def test_create_submission_records_test_results(db):
+    db.add(Student(UserID="abc12", Name="A Student", DrexelID="1"))
+    db.add(Assignment(id=1, name="hw1", rubric={}, due_date=datetime(2024, 10, 8)))
+    db.commit()
+
+    response = TestClient(app).post("/api/submissions/", json={
+        "feedback": {},
+        "test_cases": {"p1.py": {"f": {"1": True, "2": None}}},
+        "file_path": "abc12/p1.py",
+        "student_id": "abc12",
+        "assignment_id": 1,
+    })
+    assert response.status_code == 200
+
+    results = db.query(Result.test_case, Result.status).order_by(Result.test_case).all()
+    assert [tuple(row) for row in results] == [
+        ("p1.py f 1", "correct"), ("p1.py f 2", "ungraded")]
+
+
+def test_delete_submission_queued_for_grading(db):
+    db.add(Student(UserID="abc12", Name="A Student", DrexelID="1"))
+    db.add(Assignment(id=1, name="hw1", rubric={}, due_date=datetime(2024, 10, 8)))
+    submission = Submission(student_id="abc12", assignment_id=1, feedback={},
+                            test_cases={}, file_path="abc12/p1.py")
+    db.add(submission)
+    db.commit()
+    job, _ = jobs.enqueue_grading(db, 1, "ta")
+
+    response = TestClient(app).delete(f"/api/submissions/{submission.id}")
+    assert response.status_code == 200
+
+    db.expire_all()
+    assert db.query(JobTask).count() == 0
+    assert db.get(Job, job.id) is not None
+
+
+def test_delete_assignment_with_jobs(db):
+    db.add(Assignment(id=1, name="hw1", rubric={}, due_date=datetime(2024, 10, 8)))
+    db.commit()
+    jobs.enqueue_ingest(db, 1, "gradebook.zip")
+
+    response = TestClient(app).delete("/api/assignments/1")
+    assert response.status_code == 200
+
+    db.expire_all()
+    assert db.query(Job).count() == 0
+    assert db.query(JobTask).count() == 0
+
+
+def test_test_cases_follow_rubric_order(db):
+    rubric = {"test_cases": {"p2.py": {"g": {"b": "", "a": ""}}, "p1.py": {"f": {"1": ""}}}}
+    db.add(Student(UserID="abc12", Name="A Student", DrexelID="1"))
+    db.add(Assignment(id=1, name="hw1", rubric=rubric, due_date=datetime(2024, 10, 8)))
+    # Keys sorted, the way JSONB returns them
+    db.add(Submission(student_id="abc12", assignment_id=1, feedback={},
+                      file_path="abc12/p1.py",
+                      test_cases={"p1.py": {"f": {"1": None}}, "p2.py": {"g": {"a": True, "b": None}}}))
+    db.commit()
+
+    response = TestClient(app).get(
+        "/api/submissions/test_cases", params={"userid": "abc12", "assignment_number": 1})
+    test_cases = response.json()["test_cases"]
+
+    assert list(test_cases) == ["p2.py", "p1.py"]
+    assert list(test_cases["p2.py"]["g"]) == ["b", "a"]
+
+
+def test_updating_an_assignment_refreshes_the_cached_copy(db):
+    db.add(Assignment(id=1, name="hw1", rubric={"v": 1}, due_date=datetime(2024, 10, 8)))
+    db.commit()
+    assert get_assignment(db, 1).rubric == {"v": 1}
+
+    response = TestClient(app).put("/api/assignments/1", json={"rubric": {"v": 2}})
+    assert response.status_code == 200
+    assert get_assignment(db, 1).rubric == {"v": 2}
+
+    assert TestClient(app).delete("/api/assignments/1").status_code == 200
+    assert get_assignment(db, 1) is None
@@ -0,0 +1,60 @@
+import io
+import os
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import pytest
+from app.utils.extractor import Extractor, ExtractionError
+
+
+def archive(members):
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w", ZIP_DEFLATED) as zip_ref:
+        for name, data in members.items():
+            zip_ref.writestr(name, data)
+    return buffer.getvalue()
+
+
+def extract(tmp_path, members, **limits):
+    """Extract ``members`` the way a student's attempt zip inside a gradebook is."""
+    gradebook = ZipFile(io.BytesIO(archive({"attempt.zip": archive(members)})))
+    root = tmp_path / "submission"
+    Extractor(**limits).extract_archive(gradebook, gradebook.getinfo("attempt.zip"), root)
+    return root
+
+
+def extracted(root):
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob("*") if path.is_file())
+
+
+def test_rejects_high_compression_ratio(tmp_path):
+    with pytest.raises(ExtractionError, match="expands"):
+        extract(tmp_path, {"bomb.txt": b"\0" * 1024 * 1024}, max_ratio=100)
+
+
+def test_skips_parent_directory_traversal(tmp_path):
+    root = extract(tmp_path, {"../../escaped.py": b"x", "p1.py": b"print()"})
+
+    assert extracted(root) == ["p1.py"]
+    assert not any(path.name == "escaped.py" for path in tmp_path.rglob("*"))
+
+
+def test_rejects_too_many_members(tmp_path):
+    members = {f"p{i}.py": b"print()" for i in range(5)}
+    with pytest.raises(ExtractionError, match="archive entries"):
+        extract(tmp_path, members, max_entries=3)
+
+
+def test_rejects_too_many_bytes(tmp_path):
+    # Random data doesn't compress, so only the total size limit applies
+    with pytest.raises(ExtractionError, match="Extracted more than"):
+        extract(tmp_path, {"data.bin": os.urandom(64 * 1024)}, max_bytes=32 * 1024)
+
+
+def test_skips_macos_metadata(tmp_path):
+    root = extract(tmp_path, {
+        "__MACOSX/._p1.py": b"\0\5\26\7",
+        "hw1/._p1.py": b"\0\5\26\7",
+        "hw1/p1.py": b"print()",
+    })
+
+    assert extracted(root) == ["hw1/p1.py"]
@@ -0,0 +1,57 @@
+import pytest
+from app.utils import forkserver
+from app.utils.forkserver import ZygoteError, ZygotePool
+
+
+class FakeZygote:
+    def __init__(self, alive=True):
+        self.is_alive = alive
+
+    def alive(self):
+        return self.is_alive
+
+    def close(self):
+        pass
+
+
+def failing_zygote():
+    raise OSError("cannot start python")
+
+
+def test_failed_start_frees_its_slot(monkeypatch):
+    pool = ZygotePool(size=1, timeout=0.05)
+    monkeypatch.setattr(forkserver, "Zygote", failing_zygote)
+    with pytest.raises(OSError):
+        pool.acquire()
+
+    monkeypatch.setattr(forkserver, "Zygote", FakeZygote)
+    assert isinstance(pool.acquire(), FakeZygote)
+
+
+def test_acquire_times_out_when_every_zygote_is_busy(monkeypatch):
+    monkeypatch.setattr(forkserver, "Zygote", FakeZygote)
+    pool = ZygotePool(size=1, timeout=0.05)
+    pool.acquire()
+
+    with pytest.raises(ZygoteError, match="No zygote became free"):
+        pool.acquire()
+
+
+def test_failed_replacement_does_not_mask_the_run_error(monkeypatch):
+    def crash(script_path, args, limits=None):
+        zygote.is_alive = False
+        raise ZygoteError("Zygote process exited unexpectedly")
+
+    zygote = FakeZygote()
+    zygote.run = crash
+    monkeypatch.setattr(forkserver, "Zygote", lambda: zygote)
+    pool = ZygotePool(size=1, timeout=0.05)
+    pool.release(pool.acquire())
+
+    monkeypatch.setattr(forkserver, "Zygote", failing_zygote)
+    with pytest.raises(ZygoteError, match="exited unexpectedly"):
+        pool.run("p1.py", [])
+
+    # The dead zygote's slot is free again
+    monkeypatch.setattr(forkserver, "Zygote", FakeZygote)
+    assert isinstance(pool.acquire(), FakeZygote)
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Assignment, Student, Submission
+from app.utils.render import results_dir, write_results
+
+
+@pytest.fixture
+def client(db):
+    client = TestClient(app)
+    client.post("/login", data={"username": "ta"}, follow_redirects=False)
+    return client
+
+
+@pytest.fixture
+def rendered(db, tmp_path):
+    """A submission with one rendered tab."""
+    db.add(Assignment(id=1, name="hw1", rubric={}, due_date=datetime(2024, 10, 8)))
+    db.add(Student(UserID="abc12", Name="Student", DrexelID="1"))
+    db.add(Submission(student_id="abc12", assignment_id=1, feedback={}, test_cases={},
+                      file_path=str(tmp_path)))
+    db.commit()
+
+    directory = results_dir(tmp_path)
+    (directory / "r1").mkdir(parents=True)
+    _, artifacts = write_results(directory / "r1", [{"title": "p1.py", "content": "ok"}])
+    (directory / "manifest.json").write_text(json.dumps(
+        {"source": "key", "render": "r1", "artifacts": artifacts}))
+
+
+URL = "/grade/assignment/1/abc12/submission/tabs/0"
+
+
+def test_etag_differs_per_encoding(client, rendered):
+    gzipped = client.get(URL, headers={"Accept-Encoding": "gzip"})
+    identity = client.get(URL, headers={"Accept-Encoding": "identity"})
+
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["etag"] != identity.headers["etag"]
+    assert identity.json() == {"content": "ok", "error": None}
+
+
+def test_not_modified_only_for_the_same_encoding(client, rendered):
+    etag = client.get(URL, headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+    same = client.get(URL, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    other = client.get(URL, headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+
+    assert same.status_code == 304
+    assert other.status_code == 200
@@ -0,0 +1,145 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    DateTime,
+    JSON,
+    Float,
+    MetaData,
+    Table,
+    UniqueConstraint,
+    inspect,
+    select,
+    func,
+)
+from app.database import Base, migrate
+import app.models  # noqa: F401
+
+HEAD = "0008"
+
+
+def legacy_metadata(jobs=False, payload=False, fingerprint=False):
+    """The tables create_all built before the schema was migrated."""
+    metadata = MetaData()
+    Table("groups", metadata,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("group_number", Integer, nullable=False))
+    Table("assignments", metadata,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("name", String, nullable=False),
+          Column("rubric", JSON, nullable=False),
+          Column("due_date", DateTime, nullable=False))
+    Table("students", metadata,
+          Column("UserID", String, primary_key=True, index=True),
+          Column("Name", String, nullable=False),
+          Column("DrexelID", String, nullable=False),
+          Column("group_id", Integer, ForeignKey("groups.id")))
+    submission_columns = [
+        Column("id", Integer, primary_key=True, index=True),
+        Column("grade", Float, nullable=True),
+        Column("submission_date", DateTime(timezone=True),
+               server_default=func.now()),
+        Column("feedback", JSON, nullable=False),
+        Column("test_cases", JSON, nullable=False),
+        Column("file_path", String, nullable=False),
+        Column("student_id", String, ForeignKey("students.UserID"),
+               nullable=False),
+        Column("assignment_id", Integer, ForeignKey("assignments.id"),
+               nullable=False),
+        UniqueConstraint("student_id", "assignment_id",
+                         name="_student_assignment_uc"),
+    ]
+    if fingerprint:
+        submission_columns.append(Column("fingerprint", String, nullable=True))
+    Table("submissions", metadata, *submission_columns)
+
+    if jobs:
+        job_columns = [
+            Column("id", Integer, primary_key=True, index=True),
+            Column("kind", String, nullable=False),
+            Column("status", String, nullable=False, index=True),
+            Column("requested_by", String, nullable=True),
+            Column("created_at", DateTime(timezone=True),
+                   server_default=func.now()),
+            Column("finished_at", DateTime(timezone=True), nullable=True),
+            Column("assignment_id", Integer, ForeignKey("assignments.id"),
+                   nullable=True),
+        ]
+        if payload:
+            job_columns.append(Column("payload", JSON, nullable=True))
+        Table("jobs", metadata, *job_columns)
+        Table("job_tasks", metadata,
+              Column("id", Integer, primary_key=True, index=True),
+              Column("status", String, nullable=False, index=True),
+              Column("attempts", Integer, nullable=False),
+              Column("error", String, nullable=True),
+              Column("started_at", DateTime(timezone=True), nullable=True),
+              Column("finished_at", DateTime(timezone=True), nullable=True),
+              Column("job_id", Integer, ForeignKey("jobs.id"), nullable=False),
+              Column("submission_id", Integer, ForeignKey("submissions.id"),
+                     nullable=True))
+    return metadata
+
+
+def schema_diff(connection):
+    # The GIN index on submissions.test_cases is only built on Postgres
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == "index" and object.dialect_options["postgresql"]["using"])
+
+    context = MigrationContext.configure(
+        connection, opts={"include_object": include_object})
+    return compare_metadata(context, Base.metadata)
+
+
+def current_revision(connection):
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def test_migrates_fresh_database(sqlite_engine):
+    migrate(sqlite_engine)
+
+    with sqlite_engine.connect() as connection:
+        assert current_revision(connection) == HEAD
+        assert schema_diff(connection) == []
+
+
+@pytest.mark.parametrize("era", [
+    {},
+    {"jobs": True},
+    {"jobs": True, "payload": True},
+    {"jobs": True, "payload": True, "fingerprint": True},
+], ids=["baseline", "jobs", "job-payload", "fingerprint"])
+def test_migrates_create_all_database(sqlite_engine, era):
+    metadata = legacy_metadata(**era)
+    metadata.create_all(sqlite_engine)
+    tables = metadata.tables
+    with sqlite_engine.begin() as connection:
+        connection.execute(tables["groups"].insert().values(id=1, group_number=1))
+        connection.execute(tables["students"].insert().values(
+            UserID="abc12", Name="A Student", DrexelID="14000000", group_id=1))
+        connection.execute(tables["assignments"].insert().values(
+            id=1, name="A1", rubric={}, due_date=func.now()))
+        connection.execute(tables["submissions"].insert().values(
+            id=1, feedback={}, file_path="abc12/p1.py", student_id="abc12",
+            assignment_id=1,
+            test_cases={"p1.py": {"f": {"1": True, "2": False}}}))
+
+    migrate(sqlite_engine)
+    migrate(sqlite_engine)
+
+    with sqlite_engine.connect() as connection:
+        assert current_revision(connection) == HEAD
+        assert schema_diff(connection) == []
+        assert "fingerprint" in {
+            column["name"] for column in inspect(connection).get_columns("submissions")}
+
+        test_results = Base.metadata.tables["test_results"]
+        rows = connection.execute(
+            select(test_results.c.test_case, test_results.c.status)
+            .order_by(test_results.c.test_case)).all()
+        assert [tuple(row) for row in rows] == [
+            ("p1.py f 1", "correct"), ("p1.py f 2", "incorrect")]
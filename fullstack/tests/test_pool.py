@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+from app.utils.pool import PoolStats, TimedQueuePool
+
+
+class CountedPool(TimedQueuePool):
+    stats = None
+
+
+@pytest.fixture
+def stats():
+    CountedPool.stats = PoolStats()
+    return CountedPool.stats
+
+
+def test_checkout_timeout_is_counted_as_timeout(stats):
+    pool = CountedPool(lambda: sqlite3.connect(":memory:"),
+                       pool_size=1, max_overflow=0, timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+
+    snapshot = stats.snapshot()
+    assert (snapshot["checkouts"], snapshot["timeouts"], snapshot["errors"]) == (2, 1, 0)
+
+
+def test_connect_error_is_not_counted_as_timeout(stats):
+    def refuse():
+        raise sqlite3.OperationalError("connection refused")
+
+    pool = CountedPool(refuse, pool_size=1, max_overflow=0)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+
+    snapshot = stats.snapshot()
+    assert (snapshot["checkouts"], snapshot["timeouts"], snapshot["errors"]) == (1, 0, 1)
@@ -0,0 +1,109 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.database import engine, async_engine, SessionLocal
+from app.endpoints import grading
+from app.main import app
+from app.models import Assignment, Group, Job, Student, Submission
+from app.utils import jobs
+
+
+@contextmanager
+def count_queries():
+    """Collect every statement sent by the sync and async engines."""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engines = [engine, async_engine.sync_engine]
+    for bind in engines:
+        event.listen(bind, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for bind in engines:
+            event.remove(bind, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def client(db):
+    client = TestClient(app)
+    client.post("/login", data={"username": "ta"}, follow_redirects=False)
+    return client
+
+
+def seed(db, students):
+    """An assignment with one submission and one grading task per student."""
+    db.add(Group(id=1, group_number=1))
+    db.add(Assignment(id=1, name="hw1", rubric={}, due_date=datetime(2024, 10, 8)))
+    for i in range(students):
+        db.add(Student(UserID=f"s{i}", Name=f"Student {i}", DrexelID=str(i),
+                       group_id=1 if i % 2 else None))
+        db.add(Submission(student_id=f"s{i}", assignment_id=1, feedback={},
+                          test_cases={"p1.py": {"f": {"1": None}}},
+                          file_path=f"s{i}/p1.py"))
+    db.commit()
+
+    job, _ = jobs.enqueue_grading(db, 1, "ta")
+    return job.id
+
+
+def queries_for(client, url):
+    # The first request fills the per-process caches
+    assert client.get(url).status_code == 200
+    with count_queries() as statements:
+        assert client.get(url).status_code == 200
+    return len(statements)
+
+
+URLS = [
+    "/grade/assignment/1",
+    "/grade/assignment",
+    "/grade/jobs",
+    "/grade/jobs/{job_id}",
+]
+
+
+@pytest.mark.parametrize("url", URLS)
+@pytest.mark.parametrize("students", [1, 25])
+def test_query_count_does_not_grow_with_students(client, db, url, students):
+    job_id = seed(db, students)
+
+    # Fixed per route: one query for the page, plus the job and its tasks
+    expected = {
+        "/grade/assignment/1": 1,
+        "/grade/assignment": 1,
+        "/grade/jobs": 2,
+        "/grade/jobs/{job_id}": 3,
+    }
+    assert queries_for(client, url.format(job_id=job_id)) == expected[url]
+
+
+def test_progress_stream_sends_only_changes(client, db, monkeypatch):
+    monkeypatch.setattr(grading, "PROGRESS_INTERVAL", 0.01)
+    monkeypatch.setattr(grading, "KEEPALIVE_INTERVAL", 0.05)
+    job_id = seed(db, 3)
+
+    def finish():
+        with SessionLocal() as session:
+            session.get(Job, job_id).status = "done"
+            session.commit()
+
+    timer = threading.Timer(0.5, finish)
+    timer.start()
+    try:
+        body = client.get("/grade/assignment/1/progress").text
+    finally:
+        timer.join()
+
+    events = [line for line in body.splitlines() if line.startswith(("event:", ":"))]
+    assert events.count("event: task") == 3
+    # Once on connect and once when it finished, with heartbeats in between
+    assert events.count("event: job") == 2
+    assert ": keepalive" in events
+    assert events[-1] == "event: end"
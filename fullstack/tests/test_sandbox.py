@@ -0,0 +1,68 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from app.utils.forkserver import run_limited
+from app.utils.testrunner import classify
+
+pytestmark = pytest.mark.skipif(sys.platform != "linux", reason="uses rlimits and /proc")
+
+LIMITS = {"timeout": 5, "cpu": 5, "memory": 512 * 1024 ** 2, "nproc": 0, "fsize": 1024 ** 2}
+
+
+def script(tmp_path, source):
+    path = tmp_path / "p1.py"
+    path.write_text(source)
+    return path
+
+
+def run(path, limits=LIMITS, **kwargs):
+    result = run_limited(path, [], limits, limits.get("timeout"), **kwargs)
+    return classify(*result, limits=limits)
+
+
+def alive(pid):
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state != "Z"
+
+
+def test_timeout_kills_the_script(tmp_path):
+    started = time.monotonic()
+    result = run(script(tmp_path, "import time\ntime.sleep(60)\n"), {**LIMITS, "timeout": 0.5})
+
+    assert result.status == "timeout"
+    assert time.monotonic() - started < 5
+
+
+def test_output_limit_kills_the_script(tmp_path):
+    result = run(script(tmp_path, "while True:\n    print('x' * 1000)\n"),
+                 max_bytes=1024 ** 2)
+
+    assert result.status == "output_limit"
+
+
+def test_memory_limit(tmp_path):
+    result = run(script(tmp_path, "data = bytearray(1024 ** 3)\n"))
+
+    assert result.status == "memory_limit"
+
+
+def test_background_processes_are_killed_with_the_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    result = run(script(tmp_path, f"""
+import subprocess, sys
+child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+open({str(pid_file)!r}, "w").write(str(child.pid))
+"""))
+
+    assert result.status == "ok"
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(pid)
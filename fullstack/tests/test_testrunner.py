@@ -0,0 +1,95 @@
+import signal
+
+import pytest
+from app.utils import testrunner
+from app.utils.cache import DiskCache
+from app.utils.testrunner import TestRunner as Runner
+
+
+def make_runner(tmp_path, source):
+    submission = tmp_path / "abc12" / "submission"
+    submission.mkdir(parents=True, exist_ok=True)
+    (submission / "p1.py").write_text(source)
+    return Runner(tmp_path / "abc12", ["p1.py"], max_workers=1,
+                  backend="subprocess", use_cache=True, limits={})
+
+
+@pytest.fixture(autouse=True)
+def result_cache(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "cache", 1024 ** 2)
+    monkeypatch.setattr(testrunner, "result_cache", cache)
+    return cache
+
+
+CASE = ("p1.py", ["f"], "")
+
+
+def test_finished_run_is_cached(tmp_path, result_cache):
+    runner = make_runner(tmp_path, "import sys\nprint(sys.argv[1])\n")
+    [result] = runner.run_cases([CASE])
+
+    assert (result.status, result.stdout) == ("ok", "f\n")
+    assert result_cache.get(runner.cache_key(CASE)) is not None
+
+
+def test_runner_failure_is_not_cached(tmp_path, result_cache, monkeypatch):
+    runner = make_runner(tmp_path, "print('hi')\n")
+
+    def fail(*args):
+        raise BlockingIOError(11, "Resource temporarily unavailable")
+
+    monkeypatch.setattr(runner, "run_script", fail)
+    [result] = runner.run_cases([CASE])
+
+    assert (result.status, result.returncode) == ("error", None)
+    assert result_cache.get(runner.cache_key(CASE)) is None
+
+
+def test_killed_run_is_not_cached(tmp_path, result_cache):
+    runner = make_runner(
+        tmp_path, "import os, signal\nos.kill(os.getpid(), signal.SIGKILL)\n")
+    [result] = runner.run_cases([CASE])
+
+    assert result.status == "killed"
+    assert result_cache.get(runner.cache_key(CASE)) is None
+
+
+def test_content_hash_ignores_bytecode_and_dotfiles(tmp_path):
+    runner = make_runner(tmp_path, "import helper\nprint(helper.VALUE)\n")
+    submission = tmp_path / "abc12" / "submission"
+    (submission / "helper.py").write_text("VALUE = 1\n")
+    before = runner.content_hash
+
+    (submission / "__pycache__").mkdir()
+    (submission / "__pycache__" / "helper.cpython-312.pyc").write_bytes(b"\0")
+    (submission / ".pytest_cache").mkdir()
+    (submission / ".pytest_cache" / "README.md").write_text("")
+
+    assert make_runner(tmp_path, "import helper\nprint(helper.VALUE)\n").content_hash == before
+
+
+def test_content_hash_prefers_the_ingest_fingerprint(tmp_path):
+    runner = make_runner(tmp_path, "open('out.txt', 'w').write('x')\n")
+    runner.fingerprint = "f" * 64
+
+    assert runner.content_hash == "f" * 64
+
+
+@pytest.mark.parametrize("returncode, cpu_time, status", [
+    (-signal.SIGXCPU, 2.0, "cpu_limit"),
+    (-signal.SIGKILL, 3.1, "cpu_limit"),
+    (-signal.SIGKILL, 0.2, "killed"),
+    (-signal.SIGKILL, None, "killed"),
+])
+def test_sigkill_is_a_cpu_limit_only_past_the_limit(returncode, cpu_time, status):
+    result = testrunner.classify("", "", returncode, cpu_time=cpu_time, limits={"cpu": 3})
+    assert result.status == status
+
+
+def test_script_killing_itself_under_a_cpu_limit_is_killed(tmp_path):
+    runner = make_runner(
+        tmp_path, "import os, signal\nos.kill(os.getpid(), signal.SIGKILL)\n")
+    runner.limits = {"timeout": 10, "cpu": 5}
+    [result] = runner.run_cases([CASE])
+
+    assert result.status == "killed"
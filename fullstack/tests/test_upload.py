@@ -0,0 +1,63 @@
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from app import UPLOAD_DIR
+from app.main import app
+from app.models import Assignment, Job, Student, Submission, TestResult
+from app.utils import organizer, test_results
+
+
+def test_gradebook_for_unknown_assignment_is_not_found(db):
+    client = TestClient(app)
+    client.post("/login", data={"username": "ta"}, follow_redirects=False)
+
+    gradebook = io.BytesIO()
+    with zipfile.ZipFile(gradebook, "w") as archive:
+        archive.writestr("abc12/p1.py", "")
+
+    response = client.post("/upload/gradebook/", data={"assignmentId": 404},
+                           files={"gradebookFile": ("gradebook.zip", gradebook.getvalue())})
+    assert response.status_code == 404
+    assert db.query(Job).count() == 0
+    assert not (UPLOAD_DIR / "assignment_404").exists()
+
+
+def gradebook(path, source):
+    attempt = "hw1_abc12_attempt_2024-10-08-10-00-00"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr(f"{attempt}.txt",
+                         "Date Submitted: Tuesday, October 8, 2024 10:00:00 AM EDT\n")
+        archive.writestr(f"{attempt}_p1.py", source)
+    return path
+
+
+def test_new_attempt_resets_marks_and_removes_old_files(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(organizer, "UNZIP_DIR", tmp_path / "unzipped")
+    db.add(Assignment(id=1, name="hw1", due_date=datetime(2024, 10, 8),
+                      rubric={"test_cases": {"p1.py": {"f": {"1": None}}}}))
+    db.add(Student(UserID="abc12", Name="Student", DrexelID="1"))
+    db.commit()
+
+    organizer.ingest_gradebook(gradebook(tmp_path / "g1.zip", "print(1)"), 1)
+    submission = db.query(Submission).one()
+    first_upload = Path(submission.file_path)
+    submission.test_cases = {"p1.py": {"f": {"1": True}}}
+    test_results.sync_test_results(db, [(submission.id, submission.test_cases)])
+    test_results.record_runs(db, submission.id, [
+        {"type": "output", "title": "p1.py f 1", "status": "ok",
+         "duration": 0.1, "output_hash": "abc"}])
+    db.commit()
+
+    organizer.ingest_gradebook(gradebook(tmp_path / "g2.zip", "print(2)"), 1)
+    db.expire_all()
+
+    assert submission.test_cases == {"p1.py": {"f": {"1": None}}}
+    result = db.query(TestResult).one()
+    assert (result.status, result.run_status, result.duration, result.output_hash) == (
+        "ungraded", None, None, None)
+    [source] = Path(submission.file_path).glob("*_p1.py")
+    assert source.read_text() == "print(2)"
+    assert not first_upload.parent.exists()